@@ -0,0 +1 @@
+# onevents/bench
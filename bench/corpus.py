@@ -0,0 +1,89 @@
+# onevents/bench/corpus.py
+
+import argparse
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+import yaml
+
+# Словари для синтетических событий с кириллицей
+CITIES = [
+    "Москва", "Санкт-Петербург", "Новосибирск", "Екатеринбург", "Казань", "Нижний Новгород",
+    "Челябинск", "Самара", "Омск", "Ростов-на-Дону", "Уфа", "Красноярск", "Воронеж", "Пермь",
+    "Волгоград", "Краснодар", "Саратов", "Тюмень", "Ижевск", "Барнаул", "Иркутск", "Владивосток",
+]
+TITLE_WORDS = [
+    "Конференция", "Митап", "Семинар", "Завтрак", "Форум", "Встреча", "разработчиков", "1С",
+    "партнёров", "аналитиков", "Предприятие", "ERP", "осенний", "весенний", "практикум",
+]
+DESCRIPTION_WORDS = [
+    "доклады", "обсуждение", "практика", "сообщество", "интеграция", "производительность",
+    "опыт", "внедрение", "архитектура", "платформа", "эксперты", "нетворкинг", "секции",
+    "«1С:Предприятие»", "круглый стол", "мастер-класс", "вопросы", "ответы", "кофе-брейк",
+]
+STREETS = ["ул. Ленина", "пр-т Мира", "ул. Арбат", "Невский пр-т", "ул. Пушкина", "наб. Фонтанки"]
+
+
+def make_event(rng: random.Random, index: int, start: date, cities: list[str], multi_session_share: float) -> dict:
+    """Создаёт одно синтетическое событие в формате events/*.yml"""
+    event_date = start + timedelta(days=rng.randrange(0, 730))
+    city = rng.choice(cities)
+    event = {
+        "title": f"{' '.join(rng.sample(TITLE_WORDS, 3))} №{index}",
+        "date": event_date.isoformat(),
+        "city": city,
+        "address": "" if city == "Online" else f"{rng.choice(STREETS)}, {rng.randrange(1, 200)}",
+        "icon": "default.jpg",
+        "description": " ".join(rng.choice(DESCRIPTION_WORDS) for _ in range(rng.randrange(15, 60))).capitalize() + ".",
+        "registration_url": f"https://example.com/events/{index}",
+    }
+    if rng.random() < multi_session_share:
+        event["sessions"] = [
+            {
+                "date": (event_date + timedelta(days=day)).isoformat(),
+                "start_time": f"{rng.randrange(9, 13)}:00",
+                "end_time": f"{rng.randrange(16, 21)}:30",
+            }
+            for day in range(rng.randrange(2, 5))
+        ]
+    return event
+
+
+def generate_corpus(target_dir, count: int = 1000, multi_session_share: float = 0.2, cities: int = 10,
+                    seed: int = 1, start: date | None = None) -> list[Path]:
+    """Создаёт каталог с count синтетическими событиями и возвращает список файлов.
+
+    multi_session_share: доля событий с несколькими сессиями
+    cities: число городов (плюс Online)
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    start = start or date.today() - timedelta(days=365)
+    city_names = (CITIES * (cities // len(CITIES) + 1))[:cities]
+    city_names = [name if i < len(CITIES) else f"{name} {i}" for i, name in enumerate(city_names)] + ["Online"]
+
+    files = []
+    for index in range(count):
+        event = make_event(rng, index, start, city_names, multi_session_share)
+        path = target_dir / f"{event['date']}_{index:06d}.yml"
+        path.write_text(yaml.safe_dump(event, allow_unicode=True, sort_keys=False), encoding="utf-8")
+        files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор синтетических событий для бенчмарков")
+    parser.add_argument("target_dir", type=Path, help="каталог для событий")
+    parser.add_argument("--count", type=int, default=1000, help="число событий")
+    parser.add_argument("--multi-session-share", type=float, default=0.2, help="доля событий с сессиями")
+    parser.add_argument("--cities", type=int, default=10, help="число городов")
+    parser.add_argument("--seed", type=int, default=1, help="зерно генератора случайных чисел")
+    args = parser.parse_args(argv)
+    files = generate_corpus(args.target_dir, args.count, args.multi_session_share, args.cities, args.seed)
+    print(f"Создано событий: {len(files)} в {args.target_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# onevents/bench/feeds.py
+
+import argparse
+import asyncio
+import json
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+import create_web
+from create_web import BuildOptions, build
+
+from bench.corpus import generate_corpus
+
+# Срезы, которые запрашивают клиенты сервиса по запросу (по кругу)
+FEED_QUERIES = (
+    "",
+    "?online=1",
+    "?online=0&to=%2B30",
+    "?from=today&to=%2B30",
+    "?city=" + quote("Москва"),
+    "?city=" + quote("Москва,Санкт-Петербург"),
+    "?city=" + quote("Казань") + "&from=today",
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    """Ждёт, пока сервер начнёт принимать соединения"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"сервер на порту {port} не запустился")
+
+
+async def fetch(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str, target: str,
+                etag: str = "") -> tuple[int, int, str, bool]:
+    """Отправляет GET и читает ответ; возвращает (статус, байт тела, ETag, можно ли продолжать соединение)"""
+    extra = f"If-None-Match: {etag}\r\n" if etag else ""
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n".encode("utf-8"))
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    version, status = head[0].split(" ")[:2]
+    headers = {}
+    for line in head[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    size = 0
+    if status in ("204", "304"):
+        pass
+    elif "content-length" in headers:
+        size = len(await reader.readexactly(int(headers["content-length"])))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            chunk_size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if chunk_size == 0:
+                await reader.readuntil(b"\r\n")
+                break
+            size += len(await reader.readexactly(chunk_size + 2)) - 2
+    else:
+        size = len(await reader.read())
+        keep_alive = False
+    return int(status), size, headers.get("etag", ""), keep_alive
+
+
+async def run_load(base_url: str, targets, clients: int, requests: int, conditional: bool = False) -> dict:
+    """Гоняет requests запросов от clients одновременных клиентов с постоянными соединениями.
+
+    conditional: каждый клиент повторно запрашивает свой срез с If-None-Match,
+                 как приложение календаря, которое опрашивает подписку
+    """
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    prefix = url.path.rstrip("/") if url.path not in ("", "/") else ""
+    remaining = requests
+    latencies = []
+    statuses = {}
+    transferred = 0
+    errors = 0
+
+    async def client(number: int):
+        nonlocal remaining, transferred, errors
+        etags = {}
+        connection = None
+        index = number
+        while remaining > 0:
+            remaining -= 1
+            target = prefix + targets[index % len(targets)]
+            if not conditional:
+                index += 1  # подписчик же опрашивает один и тот же календарь
+            started = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection(host, port)
+                reader, writer = connection
+                status, size, etag, keep_alive = await fetch(
+                    reader, writer, url.netloc, target, etags.get(target, "") if conditional else "")
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                connection = None
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            transferred += size
+            if etag:
+                etags[target] = etag
+            if not keep_alive:
+                connection[1].close()
+                connection = None
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    seconds = time.perf_counter() - started
+    latencies.sort()
+
+    def percentile(share: float) -> float:
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * share))] * 1000, 3) if latencies else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "bytes": transferred,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def start_process(args, cwd: Path) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный тест сервиса календарей по запросу против отдачи готового файла")
+    parser.add_argument("--events-dir", type=Path, default=None,
+                        help="каталог событий (по умолчанию — синтетический корпус)")
+    parser.add_argument("--count", type=int, default=300, help="число синтетических событий")
+    parser.add_argument("--clients", type=int, default=1000, help="число одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=5000, help="число запросов в каждом прогоне")
+    parser.add_argument("--static-url", default=None,
+                        help="готовый календарь на внешнем сервере, например nginx из Docker: "
+                             "http://localhost:8080/calendar/onevents-public.ics "
+                             "(по умолчанию — python -m http.server над собранным сайтом)")
+    parser.add_argument("--json", type=Path, default=None, help="файл для результатов в JSON")
+    args = parser.parse_args(argv)
+
+    root = Path(create_web.__file__).resolve().parent
+    processes = []
+    with tempfile.TemporaryDirectory(prefix="onevents-feeds-") as tmp:
+        tmp = Path(tmp)
+        events_dir = args.events_dir
+        if events_dir is None:
+            events_dir = tmp / "events"
+            generate_corpus(events_dir, args.count, start=date.today())
+        events_dir = events_dir.resolve()
+        build(events_dir, tmp / "site", BuildOptions(
+            template_file=root / "web/index.html", img_dir=root / "img", icons_dir=root / "icons",
+            offline=True, url_cache=None, manifest_file=None, events_snapshot=None, revisions_file=None,
+            thumbnail_cache=None,
+        ))
+        try:
+            feeds_port = free_port()
+            processes.append(start_process(
+                ["create_web.py", "feeds", "--events-dir", str(events_dir), "--port", str(feeds_port),
+                 "--offline", "--url-cache", str(tmp / "urls.json"), "--revisions", str(tmp / "revisions.json"),
+                 "--events-snapshot", str(tmp / "snapshot.pickle")],
+                root,
+            ))
+            static_url = args.static_url
+            if static_url is None:
+                static_port = free_port()
+                processes.append(start_process(
+                    ["-m", "http.server", str(static_port), "--bind", "127.0.0.1", "--directory", str(tmp / "site")],
+                    root,
+                ))
+                wait_for_port(static_port)
+                static_url = f"http://127.0.0.1:{static_port}/calendar/onevents-public.ics"
+            wait_for_port(feeds_port)
+            feeds_url = f"http://127.0.0.1:{feeds_port}"
+
+            runs = {}
+            static_base, static_path = static_url.rsplit("/", 1)
+            runs["static_file"] = asyncio.run(run_load(static_base, [f"/{static_path}"], args.clients, args.requests))
+            print(f"static_file           {runs['static_file']['rps']:10.1f} запросов/с", file=sys.stderr)
+            for name, targets, conditional in (
+                ("feeds_public", ["/calendar.ics"], False),
+                ("feeds_mixed", [f"/calendar.ics{q}" for q in FEED_QUERIES], False),
+                ("feeds_conditional", [f"/calendar.ics{q}" for q in FEED_QUERIES], True),
+            ):
+                runs[name] = asyncio.run(run_load(feeds_url, targets, args.clients, args.requests, conditional))
+                print(f"{name:<20}  {runs[name]['rps']:10.1f} запросов/с", file=sys.stderr)
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    report = {
+        "python": platform.python_version(),
+        "events_dir": str(args.events_dir) if args.events_dir else None,
+        "count": args.count if args.events_dir is None else None,
+        "clients": args.clients,
+        "static_url": args.static_url,
+        "runs": runs,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json:
+        args.json.write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
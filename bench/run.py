@@ -0,0 +1,138 @@
+# onevents/bench/run.py
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+import create_web
+from create_web import (
+    BuildOptions, build, generate_event_calendars, generate_event_vevent, generate_pages, generate_public_calendars,
+    load_events, map_link, render_event, TEMPLATE_FILE,
+)
+from utils.loader import load_event_files
+from utils.manifest import BuildManifest
+from utils.shortener import shorten_urls
+
+from bench.corpus import generate_corpus
+from bench.stub_shortener import StubShortener
+
+
+def measure(func, repeat: int = 3) -> float:
+    """Возвращает лучшее время выполнения func за repeat запусков, секунд"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_benchmarks(events_dir: Path, work_dir: Path, repeat: int = 3, latency: float = 0.05,
+                   workers: int | None = None) -> dict:
+    """Замеряет стадии сборки на каталоге событий и возвращает результаты"""
+    today = date.today()
+    store = load_events(events_dir)
+    all_events, events = store.events, store.upcoming(today)
+    template = TEMPLATE_FILE.read_text(encoding="utf-8")
+    results = {}
+
+    def record(name, func, items, stage_repeat=repeat):
+        seconds = measure(func, stage_repeat)
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "items": items,
+            "us_per_item": round(seconds / items * 1e6, 3) if items else None,
+        }
+        print(f"{name:<24} {seconds:10.4f} s  {items:>8} шт.", file=sys.stderr)
+
+    record("load_yaml", lambda: load_event_files(events_dir, workers=workers), len(all_events))
+
+    map_links = [map_link(e.city, e.address) for e in all_events]
+    with StubShortener(latency=latency) as stub:
+        short_urls = shorten_urls(map_links, endpoint=stub.endpoint)
+        record("shorten_urls", lambda: shorten_urls(map_links, endpoint=stub.endpoint),
+               len(set(filter(None, map_links))), stage_repeat=1)
+
+    record("render_event", lambda: [render_event(e) for e in events], len(events))
+
+    def vevents():
+        for e in all_events:
+            for i, session in enumerate(e.sessions or [None]):
+                generate_event_vevent(e, session, i + 1 if session else None, short_urls=short_urls)
+    record("generate_event_vevent", vevents, len(all_events))
+
+    calendar_dir = work_dir / "calendar"
+    calendar_dir.mkdir(parents=True, exist_ok=True)
+
+    def public_feeds():
+        create_web.clear_vevent_cache()
+        return generate_public_calendars(store, calendar_dir, short_urls, manifest=BuildManifest())
+    record("public_feeds", public_feeds, len(all_events))
+    public_calendars = public_feeds()
+
+    def event_calendars():
+        create_web.clear_vevent_cache()
+        generate_event_calendars(events, calendar_dir, short_urls, manifest=BuildManifest())
+    record("event_calendars", event_calendars, len(events))
+
+    def pages():
+        # Все страницы сайта (главная, пагинация, города и месяцы) с нуля, как при первой сборке
+        create_web._card_cache.clear()
+        return generate_pages(store, today, template, work_dir / "pages", public_calendars,
+                              builddate=today.isoformat(), manifest=BuildManifest())
+    record("pages", pages, len(events))
+
+    def full_build():
+        create_web.clear_vevent_cache()
+        build(events_dir, work_dir / "site", BuildOptions(
+            offline=True, url_cache=None, manifest_file=None, events_snapshot=None, revisions_file=None,
+            thumbnail_cache=None, workers=workers,
+        ))
+    record("build", full_build, len(all_events), stage_repeat=1)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки стадий сборки OnEvents")
+    parser.add_argument("--events-dir", type=Path, default=None,
+                        help="каталог событий (по умолчанию — синтетический корпус)")
+    parser.add_argument("--count", type=int, default=1000, help="число синтетических событий")
+    parser.add_argument("--multi-session-share", type=float, default=0.2, help="доля событий с сессиями")
+    parser.add_argument("--cities", type=int, default=10, help="число городов")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов каждой стадии")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка заглушки clck.ru, секунд")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов для разбора событий")
+    parser.add_argument("--json", type=Path, default=None, help="файл для результатов в JSON")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="onevents-bench-") as tmp:
+        tmp = Path(tmp)
+        events_dir = args.events_dir
+        if events_dir is None:
+            events_dir = tmp / "events"
+            generate_corpus(events_dir, args.count, args.multi_session_share, args.cities)
+        stages = run_benchmarks(events_dir, tmp / "out", args.repeat, args.latency, args.workers)
+
+    report = {
+        "python": platform.python_version(),
+        "events_dir": str(args.events_dir) if args.events_dir else None,
+        "count": args.count if args.events_dir is None else None,
+        "multi_session_share": args.multi_session_share,
+        "cities": args.cities,
+        "stages": stages,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json:
+        args.json.write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# onevents/bench/stub_shortener.py
+
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubShortener:
+    """Локальная замена сервиса clck.ru с настраиваемой задержкой ответа.
+
+    Запоминает все запрошенные URL в calls. Используется как контекстный менеджер:
+
+        with StubShortener(latency=0.2) as stub:
+            shorten_urls(urls, endpoint=stub.endpoint)
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.calls: list[str] = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = parse_qs(urlparse(self.path).query).get("url", [""])[0]
+                with stub._lock:
+                    stub.calls.append(url)
+                time.sleep(stub.latency)
+                body = f"https://clck.ru/{hashlib.sha1(url.encode()).hexdigest()[:6]}".encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/--"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Локальная заглушка сервиса сокращения ссылок")
+    parser.add_argument("--port", type=int, default=8765, help="порт")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа, секунд")
+    args = parser.parse_args(argv)
+    stub = StubShortener(latency=args.latency, port=args.port)
+    print(f"Заглушка слушает {stub.endpoint} (задержка {args.latency} с)")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
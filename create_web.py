@@ -1,59 +1,128 @@
-import os
-import yaml
-from datetime import datetime, date
+import argparse
+import functools
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from email.utils import formatdate
 from pathlib import Path
-from babel.dates import format_date
-import shutil
 import hashlib
-import requests
+import heapq
 
 from utils.text import clean_text, make_slug, to_hhmmss, SAFE_CHARS_PATTERN, DASHES_SPACES_PATTERN
+from utils.shortener import (
+    UrlCache, shorten_urls, SHORTENER_URL, DEFAULT_CACHE_FILE, DEFAULT_CACHE_TTL, DEFAULT_CACHE_SIZE,
+    DEFAULT_CONCURRENCY, DEFAULT_DEADLINE,
+)
+from utils.ics import CRLF, escape_text, fold_lines
+from utils.loader import load_event_files, DEFAULT_SNAPSHOT_FILE
+from utils.model import Event, EventStore, Session, ONLINE_CITIES
+from utils.recurrence import Override
+from utils.compress import precompress
+from utils.images import Thumbnail, build_thumbnails, DEFAULT_THUMBNAIL_CACHE
+from utils.search import build_event_index
+from utils.revisions import EventRevisions, DEFAULT_REVISIONS_FILE, format_ics_utc
+from utils.devserver import DevServer
+from utils.feeds import FeedQuery, ResponseCache, DEFAULT_CACHE_BYTES, FEED_PATH
+from utils.watch import PollingWatcher, DEFAULT_INTERVAL
+from utils.stats import BuildStats
+from utils.manifest import BuildManifest, DEFAULT_MANIFEST_FILE, hash_parts, hash_files
 
 # Пути
 EVENTS_DIR = Path("events")
 TEMPLATE_FILE = Path("web/index.html")
 OUTPUT_DIR = Path("site")
-OUTPUT_FILE = OUTPUT_DIR / "index.html"
+IMG_DIR = Path("img")
+ICONS_DIR = Path("icons")
 
-# Загружаем шаблон
-template = TEMPLATE_FILE.read_text(encoding="utf-8")
+# Число карточек на одной странице «Все города»
+PAGE_SIZE = 30
 
-# Список событий
-all_events = []  # все события (включая прошедшие)
-events = []      # только будущие события для карточек/индивидуальных .ics
+# Сколько дней прошедшие события остаются в общем и городских календарях
+FEED_WINDOW_DAYS = 90
 
-for file in EVENTS_DIR.glob("*.yml"):
-    with open(file, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
 
-    event_date = datetime.strptime(data["date"], "%Y-%m-%d").date()
-    all_events.append(data)
-    if event_date >= datetime.today().date():
-        events.append(data)
+@dataclass
+class BuildOptions:
+    """Параметры сборки сайта"""
+    template_file: Path = TEMPLATE_FILE
+    img_dir: Path = IMG_DIR
+    icons_dir: Path = ICONS_DIR
+    today: date | None = None  # дата, относительно которой событие считается будущим
+    offline: bool = False  # не обращаться к сети
+    url_cache: Path | None = DEFAULT_CACHE_FILE
+    url_cache_ttl: float = DEFAULT_CACHE_TTL  # секунд
+    url_cache_size: int = DEFAULT_CACHE_SIZE
+    shortener_url: str = SHORTENER_URL
+    shortener_concurrency: int = DEFAULT_CONCURRENCY
+    shortener_deadline: float = DEFAULT_DEADLINE
+    manifest_file: Path | None = DEFAULT_MANIFEST_FILE  # манифест для инкрементальной сборки
+    full_rebuild: bool = False  # игнорировать манифест и пересобрать всё
+    events_snapshot: Path | None = DEFAULT_SNAPSHOT_FILE  # снимок разобранных событий
+    workers: int | None = None  # число процессов для разбора событий
+    thumbnail_cache: Path | None = DEFAULT_THUMBNAIL_CACHE  # кэш готовых миниатюр логотипов
+    page_size: int = PAGE_SIZE  # число карточек на странице «Все города»
+    precompress: bool = False  # писать рядом с текстовыми файлами сжатые копии .gz и .br
+    revisions_file: Path | None = DEFAULT_REVISIONS_FILE  # ревизии VEVENT для стабильных отметок времени
+    feed_window: int | None = FEED_WINDOW_DAYS  # дней прошлого в календарях; None — все события, без архива
 
-# Сортируем по дате
-all_events.sort(key=lambda e: e["date"])  # для общего календаря
-events.sort(key=lambda e: e["date"])      # для карточек/индивидуальных .ics
 
-# Функция для сокращения ссылок через clck.ru
-def shorten_url(url: str) -> str:
-    """Сокращает URL через сервис clck.ru"""
-    
-    if not url:
-        return url
-    
-    try:
-        response = requests.get('https://clck.ru/--', params={'url': url}, timeout=5)
-        if response.status_code == 200:
-            return response.text.strip()
-        else:
-            # Если сервис недоступен, возвращаем оригинальную ссылку
-            return url
-    except Exception:
-        # В случае любой ошибки возвращаем оригинальную ссылку
-        return url
+@dataclass
+class BuildState:
+    """Состояние, которое резидентный режим (serve --watch) держит в памяти между сборками"""
+    parsed: dict = field(default_factory=dict)  # разобранные файлы событий {путь: ((mtime, размер), событие)}
+    manifest: BuildManifest | None = None  # манифест прошлой сборки
+    url_cache: UrlCache | None = None
+    revisions: EventRevisions | None = None
+
+
+# Функция форматирования даты по-русски
+def format_ru_date(value, fmt: str) -> str:
+    """Форматирует дату через babel (импортируется только при первом вызове)"""
+    from babel.dates import format_date
+    return format_date(value, format=fmt, locale="ru")
+
+# Функция вычисления отпечатка кода генератора
+@functools.lru_cache(maxsize=None)
+def generator_fingerprint() -> str:
+    """Хеш исходников генератора: при их изменении все выходные файлы пересобираются"""
+    root = Path(__file__).resolve().parent
+    return hash_files([root / "create_web.py", *(root / "utils").glob("*.py")])
+
+# Функция вычисления ключа входных данных для выходного файла
+def events_key(events, short_urls=None, *extra) -> str:
+    """Хеш входов выходного файла: код генератора, события, их короткие ссылки и доп. параметры"""
+    return hash_parts(
+        generator_fingerprint(),
+        *extra,
+        *(e.digest + short_map_link(e, short_urls) for e in events),
+    )
+
+# Функция вычисления ключа содержимого календаря
+def feed_content_key(events, short_urls=None, *extra, cache: bool = True) -> str:
+    """Хеш содержимого календаря: доп. параметры заголовка и хеши его VEVENT по порядку.
+
+    В отличие от events_key, не зависит от кода генератора.
+    cache: запомнить VEVENT в кэше, см. event_vevent_parts
+    """
+    return hash_parts(*extra, *(
+        digest for e in events for _, _, _, digest in event_vevent_parts(e, short_urls, cache)
+    ))
+
+# Функция загрузки событий
+def load_events(events_dir: Path, snapshot_file: Path | None = None, workers: int | None = None,
+                parsed: dict | None = None) -> EventStore:
+    """Загружает события в хранилище, упорядоченное по дате (затем заголовку и городу)
+
+    parsed: разобранные файлы событий в памяти (резидентный режим), см. load_event_files
+    """
+    return EventStore(load_event_files(events_dir, snapshot_file=snapshot_file, workers=workers, entries=parsed))
 
 # Функция для создания ссылки на Яндекс.Карты
+@functools.lru_cache(maxsize=100_000)
 def map_link(city: str, address: str = "") -> str:
     """Создает ссылку на Яндекс.Карты"""
     
@@ -62,7 +131,7 @@ def map_link(city: str, address: str = "") -> str:
         return ""
 
     # Не показываем для онлайн событий
-    if city.lower() in ['online', 'онлайн']:
+    if city.lower() in ONLINE_CITIES:
         return ""
     
     # Не показываем если в адресе есть слова о неопределенности
@@ -78,6 +147,12 @@ def map_link(city: str, address: str = "") -> str:
     
     return f"https://yandex.ru/maps/?text={encoded_address}"
 
+# Функция получения короткой ссылки на карту для события
+def short_map_link(event: Event, short_urls: dict[str, str] | None = None) -> str:
+    """Возвращает короткую ссылку на карту из заранее подготовленного словаря short_urls"""
+    link = map_link(event.city, event.address)
+    return (short_urls or {}).get(link, link)
+
 # Функция для добавления UTM меток к ссылкам регистрации
 def add_utm_marks(url: str) -> str:
     """Добавляет UTM метки к ссылке регистрации, если их там нет"""
@@ -107,21 +182,22 @@ def add_utm_marks(url: str) -> str:
     return url + utm_params
 
 
-def generate_event_vevent(event, session=None, session_index=None):
-    """Генерирует VEVENT для события или сессии"""
+def generate_event_vevent(event: Event, session: Session | None = None, session_index=None, short_urls=None,
+                          override: Override | None = None):
+    """Генерирует VEVENT для события, сессии, серии (с RRULE) или изменённого повторения серии"""
     # Создаем уникальный UID на основе всех ключевых характеристик события
     # Используем более детальную строку для генерации UID
     uid_components = [
-        event['title'],
-        event['date'],
-        event['city'],
-        event.get('address', ''),
-        event.get('registration_url', '')
+        event.title,
+        event.iso_date,
+        event.city,
+        event.address,
+        event.registration_url,
     ]
     
     if session_index is not None:
         # Для сессий добавляем информацию о сессии
-        session_info = f"{session['date']}-{session['start_time']}-{session['end_time']}"
+        session_info = f"{session.date.isoformat()}-{session.start_time}-{session.end_time}"
         uid_components.append(session_info)
         uid_components.append(str(session_index))
     
@@ -130,35 +206,36 @@ def generate_event_vevent(event, session=None, session_index=None):
     uid = hashlib.md5(uid_string.encode('utf-8')).hexdigest() # NOSONAR
     
     # Формируем адрес
-    location = event['city']
-    if event['address']:
-        location += f", {event['address']}"
+    location = event.city
+    if event.address:
+        location += f", {event.address}"
+    location = escape_text(location)
     
-    title = clean_text(event['title'])
-    description = clean_text(event['description'])
+    title = clean_text(event.title)
+    description = clean_text(event.description)
     
     if session:
         # Сессия события
-        session_date = datetime.strptime(session['date'], "%Y-%m-%d")
+        session_date = session.date
         
-        # Формируем время начала и окончания
-        start_datetime = f"{session_date.strftime('%Y%m%d')}T{to_hhmmss(session['start_time'])}"
-        end_datetime = f"{session_date.strftime('%Y%m%d')}T{to_hhmmss(session['end_time'])}"
+        # Формируем время начала и окончания (время уже нормализовано при загрузке)
+        start_datetime = f"{session_date.strftime('%Y%m%d')}T{session.start}"
+        end_datetime = f"{session_date.strftime('%Y%m%d')}T{session.end}"
         
         # Название сессии с датой
-        date_str = format_date(session_date, format="d MMMM", locale="ru")
+        date_str = format_ru_date(session_date, "d MMMM")
         session_title = f"{title} ({date_str})"
         
         
         # Добавляем короткую ссылку на карту если есть
-        map_url = shorten_url(map_link(event['city'], event['address']))
+        map_url = short_map_link(event, short_urls)
         map_text = ""
         if map_url:
             map_text = f"\\n\\nПоказать на карте: {map_url}"
         
         description_text = (
-            f"{description}\\n\\nСсылка на регистрацию: {event['registration_url']}"
-            f"\\n\\nВремя: {session['start_time']}-{session['end_time']}{map_text}"
+            f"{description}\\n\\nСсылка на регистрацию: {event.registration_url}"
+            f"\\n\\nВремя: {session.start_time}-{session.end_time}{map_text}"
         )
         
         return f"""BEGIN:VEVENT
@@ -171,19 +248,75 @@ LOCATION:{location}
 STATUS:CONFIRMED
 TRANSP:OPAQUE
 END:VEVENT"""
+    elif event.recurrence:
+        # Серия: один VEVENT с правилом повторения, изменённые повторения — отдельные VEVENT с тем же UID
+        recurrence = event.recurrence
+        
+        # Добавляем короткую ссылку на карту если есть
+        map_url = short_map_link(event, short_urls)
+        map_text = ""
+        if map_url:
+            map_text = f"\\n\\nПоказать на карте: {map_url}"
+        
+        if override is None:
+            occurrence_date = event.date
+            start_time, end_time = recurrence.start_time, recurrence.end_time
+            recurrence_id_lines = []
+            rule_lines = [f"RRULE:{recurrence.rule.to_ics()}"]
+            if recurrence.rdates:
+                rule_lines.append("RDATE:" + ",".join(
+                    f"{d.strftime('%Y%m%d')}T{recurrence.start}" for d in recurrence.rdates
+                ))
+            if recurrence.exdates:
+                rule_lines.append("EXDATE:" + ",".join(
+                    f"{d.strftime('%Y%m%d')}T{recurrence.start}" for d in recurrence.exdates
+                ))
+        else:
+            # RECURRENCE-ID идёт сразу за UID: по нему различаются ревизии повторений серии
+            occurrence_date = override.date
+            start_time = override.start_time or recurrence.start_time
+            end_time = override.end_time or recurrence.end_time
+            if override.description:
+                description = clean_text(override.description)
+            recurrence_id_lines = [f"RECURRENCE-ID:{override.date.strftime('%Y%m%d')}T{recurrence.start}"]
+            rule_lines = []
+        
+        start_datetime = f"{occurrence_date.strftime('%Y%m%d')}T{to_hhmmss(start_time)}"
+        end_datetime = f"{occurrence_date.strftime('%Y%m%d')}T{to_hhmmss(end_time)}"
+        
+        description_text = (
+            f"{description}\\n\\nСсылка на регистрацию: {event.registration_url}"
+            f"\\n\\nВремя: {start_time}-{end_time}{map_text}"
+        )
+        
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@onevents.ru",
+            *recurrence_id_lines,
+            f"DTSTART:{start_datetime}",
+            f"DTEND:{end_datetime}",
+            *rule_lines,
+            f"SUMMARY:{title}",
+            f"DESCRIPTION:{description_text}",
+            f"LOCATION:{location}",
+            "STATUS:CONFIRMED",
+            "TRANSP:OPAQUE",
+            "END:VEVENT",
+        ]
+        return "\n".join(lines)
     else:
         # Обычное однодневное событие
-        event_date = datetime.strptime(event['date'], "%Y-%m-%d")
+        event_date = event.date
         
          
         # Добавляем ссылку на карту если есть
-        map_url = shorten_url(map_link(event['city'], event['address']))
+        map_url = short_map_link(event, short_urls)
         map_text = ""
         if map_url:
             map_text = f"\\n\\nПоказать на карте: {map_url}"
         
         description_text = (
-            f"{description}\\n\\nСсылка на регистрацию: {event['registration_url']}{map_text}"
+            f"{description}\\n\\nСсылка на регистрацию: {event.registration_url}{map_text}"
         )
         
         return f"""BEGIN:VEVENT
@@ -196,129 +329,310 @@ STATUS:CONFIRMED
 TRANSP:OPAQUE
 END:VEVENT"""
 
-# Функция генерации общего календаря со всеми событиями
-def generate_public_calendar(events, calendar_name: str | None = None, wr_url: str | None = None):
-    """Генерирует общий календарь со всеми событиями.
+# Кэш готовых VEVENT блоков (с переносами строк и CRLF, без отметок времени), LRU с ограничением по памяти
+# {(отпечаток события, ссылка на карту): ((UID, начало блока до UID включительно, остаток блока, хеш), ...)}
+VEVENT_CACHE_BYTES = 32 * 1024 * 1024
+_vevent_cache: OrderedDict[tuple[str, str], tuple[tuple[str, str, str, str], ...]] = OrderedDict()
+_vevent_cache_bytes = 0
+
+# Функция разбиения VEVENT блока для вставки отметок времени
+def split_vevent(block: str) -> tuple[str, str, str, str]:
+    """Делит готовый VEVENT на (ключ ревизии, строки до UID включительно, остальные строки, хеш содержимого).
+
+    Ключ ревизии — UID, у изменённого повторения серии к нему добавляется RECURRENCE-ID.
+    """
+    uid_start = block.index("UID:")
+    uid_end = block.index(CRLF, uid_start) + len(CRLF)
+    uid = block[uid_start + len("UID:"):uid_end - len(CRLF)]
+    if block.startswith("RECURRENCE-ID:", uid_end):
+        # Изменённые повторения серии делят UID с ней: ревизию ведём для каждого повторения
+        uid += "/" + block[uid_end + len("RECURRENCE-ID:"):block.index(CRLF, uid_end)]
+    return uid, block[:uid_end], block[uid_end:], hash_parts(block)
+
+# Функция получения частей VEVENT блоков события
+def event_vevent_parts(event: Event, short_urls=None, cache: bool = True) -> tuple[tuple[str, str, str, str], ...]:
+    """Возвращает части VEVENT блоков события (по одному на сессию или изменённое повторение серии),
+    см. split_vevent.
+
+    Блоки вычисляются один раз для каждого содержимого события и затем
+    переиспользуются всеми календарями: календарём события, общим и городским.
+    Кэш ограничен VEVENT_CACHE_BYTES, поэтому память не растёт с размером календаря.
+    cache: запомнить вычисленные блоки (архивам это не нужно — их события больше не понадобятся)
+    """
+    global _vevent_cache_bytes
+    key = (event.digest, short_map_link(event, short_urls))
+    parts = _vevent_cache.get(key)
+    if parts is not None:
+        _vevent_cache.move_to_end(key)
+        return parts
+
+    # Проверяем, есть ли сессии у события (они уже отсортированы по дате и времени)
+    if event.sessions:
+        # Создаем отдельный VEVENT для каждой сессии
+        blocks = [
+            fold_lines(generate_event_vevent(event, session, i + 1, short_urls=short_urls))
+            for i, session in enumerate(event.sessions)
+        ]
+    elif event.recurrence:
+        # Серия целиком — один VEVENT с RRULE и по VEVENT на каждое изменённое повторение
+        blocks = [fold_lines(generate_event_vevent(event, short_urls=short_urls))]
+        blocks.extend(
+            fold_lines(generate_event_vevent(event, short_urls=short_urls, override=override))
+            for override in event.recurrence.overrides
+        )
+    else:
+        # Обычное однодневное событие
+        blocks = [fold_lines(generate_event_vevent(event, short_urls=short_urls))]
+    parts = tuple(split_vevent(block) for block in blocks)
+    if not cache:
+        return parts
+
+    _vevent_cache[key] = parts
+    _vevent_cache_bytes += vevent_parts_size(parts)
+    while _vevent_cache_bytes > VEVENT_CACHE_BYTES and _vevent_cache:
+        # Вытесняем давно не использованную запись
+        _, evicted = _vevent_cache.popitem(last=False)
+        _vevent_cache_bytes -= vevent_parts_size(evicted)
+    return parts
+
+# Функция очистки кэша VEVENT блоков
+def clear_vevent_cache():
+    """Очищает кэш VEVENT блоков"""
+    global _vevent_cache_bytes
+    _vevent_cache.clear()
+    _vevent_cache_bytes = 0
+
+# Функция оценки памяти под части VEVENT блоков
+def vevent_parts_size(parts) -> int:
+    """Сколько байт памяти занимают строки частей VEVENT блоков"""
+    return sum(sys.getsizeof(head) + sys.getsizeof(tail) for _, head, tail, _ in parts)
+
+# Функция получения VEVENT блоков события
+def event_vevents(event, short_urls=None, revisions: EventRevisions | None = None,
+                  cache: bool = True) -> tuple[str, ...]:
+    """Возвращает готовые к записи VEVENT блоки события с DTSTAMP, LAST-MODIFIED и SEQUENCE.
+
+    Отметки времени берутся из ревизий и меняются, только когда меняется содержимое VEVENT.
+    cache: запомнить блоки в кэше VEVENT, см. event_vevent_parts
+    """
+    revisions = revisions or EventRevisions()
+    vevents = []
+    for uid, head, tail, digest in event_vevent_parts(event, short_urls, cache):
+        timestamp, sequence = revisions.stamp(uid, digest, event.digest)
+        stamp = format_ics_utc(timestamp)
+        vevents.append(f"{head}DTSTAMP:{stamp}{CRLF}LAST-MODIFIED:{stamp}{CRLF}SEQUENCE:{sequence}{CRLF}{tail}")
+    return tuple(vevents)
+
+# Функция вычисления времени последнего изменения календаря
+def calendar_timestamp(events, short_urls=None, revisions: EventRevisions | None = None) -> int:
+    """Время последнего изменения входящих в календарь VEVENT (0 для пустого календаря)"""
+    revisions = revisions or EventRevisions()
+    return max(
+        (revisions.stamp(uid, digest, event.digest)[0]
+         for event in events
+         for uid, _, _, digest in event_vevent_parts(event, short_urls)),
+        default=0,
+    )
+
+# Функция потоковой генерации общего календаря
+def iter_public_calendar(events, calendar_name: str | None = None, wr_url: str | None = None,
+                         short_urls: dict[str, str] | None = None, revisions: EventRevisions | None = None,
+                         refresh: str = "PT1H", modified: int | None = None, cache: bool = True):
+    """Отдаёт общий календарь со всеми событиями по частям (по одному компоненту).
 
     calendar_name: заголовок календаря для X-WR-CALNAME
     wr_url: значение для X-WR-URL (публичная ссылка на файл)
+    short_urls: короткие ссылки на карты {исходная ссылка: короткая}
+    revisions: ревизии VEVENT, из которых берутся отметки времени
+    refresh: рекомендуемый интервал обновления подписки (длительность iCalendar)
+    modified: время изменения календаря (см. EventRevisions.feed_stamp); без него —
+              самое позднее изменение его событий, а не время сборки
+    cache: запоминать VEVENT событий в кэше (архивным календарям не нужно)
     """
     
-    # Текущее время для метаданных
-    now = datetime.now()
-    now_str = now.strftime('%Y%m%dT%H%M%SZ')
+    revisions = revisions or EventRevisions()
+    if modified is None:
+        modified = calendar_timestamp(events, short_urls, revisions)
+    modified_str = format_ics_utc(modified)
     
     default_name = "Cобытия 1C - OnEvents"
     cal_name = calendar_name or default_name
     cal_url = wr_url
 
-    ics_content = f"""BEGIN:VCALENDAR
+    yield fold_lines(f"""BEGIN:VCALENDAR
 VERSION:2.0
 PRODID:-//OnEvents//OnEvents Calendar//RU
 CALSCALE:GREGORIAN
 METHOD:PUBLISH
-X-WR-CALNAME:{cal_name}
+X-WR-CALNAME:{escape_text(cal_name)}
 X-WR-CALDESC:Календарь 1С событий от OnEvents
 X-WR-TIMEZONE:Europe/Moscow
 X-WR-URL:{cal_url}
-REFRESH-INTERVAL;VALUE=DURATION:PT1H
-X-PUBLISHED-TTL:PT1H
-LAST-MODIFIED:{now_str}
-DTSTAMP:{now_str}"""
+REFRESH-INTERVAL;VALUE=DURATION:{refresh}
+X-PUBLISHED-TTL:{refresh}
+LAST-MODIFIED:{modified_str}
+DTSTAMP:{modified_str}""")
     
     # Добавляем все события в календарь
     for event in events:
-        # Проверяем, есть ли секция sessions для события
-        if 'sessions' in event and event['sessions']:
-            sessions = event['sessions']
-            # Сортируем сессии по дате
-            sessions.sort(key=lambda x: x['date'])
-            
-            # Создаем отдельный VEVENT для каждой сессии
-            for i, session in enumerate(sessions):
-                vevent = generate_event_vevent(event, session, i + 1)
-                ics_content += f"\n{vevent}"
-        else:
-            # Обычное однодневное событие
-            vevent = generate_event_vevent(event)
-            ics_content += f"\n{vevent}"
+        yield from event_vevents(event, short_urls, revisions, cache)
     
-    ics_content += """
-END:VCALENDAR"""
-    
-    return ics_content
+    yield "END:VCALENDAR" + CRLF
 
-# Функция генерации ICS файла для события
-def generate_ics_content(event):
-    """Генерирует содержимое .ics файла для события"""
+# Функция потоковой генерации ICS файла для события
+def iter_ics_content(event, short_urls=None, revisions: EventRevisions | None = None):
+    """Отдаёт содержимое .ics файла для события по частям"""
     
-    # Формируем ICS содержимое
-    ics_content = """BEGIN:VCALENDAR
+    yield fold_lines("""BEGIN:VCALENDAR
 VERSION:2.0
 PRODID:-//OnEvents//OnEvents Calendar//RU
 CALSCALE:GREGORIAN
-METHOD:PUBLISH"""
+METHOD:PUBLISH""")
     
-    # Проверяем, есть ли секция sessions для события
-    if 'sessions' in event and event['sessions']:
-        sessions = event['sessions']
-        # Сортируем сессии по дате
-        sessions.sort(key=lambda x: x['date'])
-        
-        # Создаем отдельный VEVENT для каждой сессии
-        for i, session in enumerate(sessions):
-            vevent = generate_event_vevent(event, session, i + 1)
-            ics_content += f"\n{vevent}"
-    else:
-        # Обычное однодневное событие
-        vevent = generate_event_vevent(event)
-        ics_content += f"\n{vevent}"
+    yield from event_vevents(event, short_urls, revisions)
     
-    ics_content += """
-END:VCALENDAR"""
-    
-    return ics_content
+    yield "END:VCALENDAR" + CRLF
+
+# Функция разделения событий на оперативные и архивные
+def split_feed_window(store: EventStore, since: date | None = None):
+    """Делит события на (события окна оперативных календарей, архив {год: события}).
+
+    since: первый день окна; события, закончившиеся раньше, уходят в архив по году начала.
+    Без since все события попадают в окно, архив пуст.
+    """
+    if since is None:
+        return list(store.events), {}
+    hot_events = []
+    archive = {}
+    # Начавшиеся до окна события остаются в нём, только если их сессии заходят в окно
+    for event in store.between(None, since):
+        if event.last_date >= since:
+            hot_events.append(event)
+        else:
+            archive.setdefault(str(event.date.year), []).append(event)
+    hot_events.extend(store.between(since))
+    return hot_events, archive
+
+# Функция записи одного публичного календаря
+def write_public_calendar(events, calendar_dir, filename: str, calendar_name: str, short_urls=None,
+                          manifest: BuildManifest | None = None, revisions: EventRevisions | None = None,
+                          refresh: str = "PT1H", cache: bool = True) -> str:
+    """Пишет публичный календарь, если его входы изменились, и возвращает его публичную ссылку
+
+    cache: запоминать VEVENT событий в кэше, см. event_vevent_parts
+    """
+    manifest = manifest or BuildManifest()
+    revisions = revisions or EventRevisions()
+    url = f"https://onevents.ru/calendar/{filename}"
+    path = calendar_dir / filename
+    key = events_key(events, short_urls, url, calendar_name, refresh)
+    if manifest.unchanged(path, key):
+        revisions.keep_feed(filename)
+    else:
+        # Время изменения календаря меняется вместе с его содержимым, в том числе когда события из него уходят,
+        # но не при правке кода, которая не меняет календарь
+        content_key = feed_content_key(events, short_urls, url, calendar_name, refresh, cache=cache)
+        modified = revisions.feed_stamp(filename, content_key)
+        content = iter_public_calendar(
+            events,
+            calendar_name=calendar_name,
+            wr_url=url,
+            short_urls=short_urls,
+            revisions=revisions,
+            refresh=refresh,
+            modified=modified,
+            cache=cache,
+        )
+        manifest.write_stream(path, content, key, mtime=modified)
+    return url
 
 # Функция генерации публичных календарей
-def generate_public_calendars(all_events, calendar_dir):
-    """Генерирует все публичные календари и возвращает список кортежей (название, ссылка, город)"""
+def generate_public_calendars(store: EventStore, calendar_dir, short_urls=None, manifest: BuildManifest | None = None,
+                              revisions: EventRevisions | None = None, since: date | None = None):
+    """Генерирует все публичные календари и возвращает список кортежей (название, ссылка, город)
+
+    manifest: манифест сборки; календари с неизменными входами не пересоздаются
+    revisions: ревизии VEVENT; время изменения файла календаря равно времени изменения его событий
+    since: первый день окна общего и городских календарей; более старые события
+           попадают в годовые архивные календари onevents-archive-YYYY.ics
+    """
     
+    manifest = manifest or BuildManifest()
+    revisions = revisions or EventRevisions()
     public_calendars = []
+    hot_events, archive = split_feed_window(store, since)
     
-    # Генерируем общий календарь со всеми событиями
-    public_calendar_url = "https://onevents.ru/calendar/onevents-public.ics"
-    public_calendar_content = generate_public_calendar(
-        all_events,
-        calendar_name="События 1С - OnEvents",
-        wr_url=public_calendar_url,
+    # Генерируем общий календарь с событиями окна
+    public_calendar_url = write_public_calendar(
+        hot_events, calendar_dir, "onevents-public.ics", "События 1С - OnEvents",
+        short_urls, manifest, revisions,
     )
-    public_calendar_path = calendar_dir / "onevents-public.ics"
-    public_calendar_path.write_text(public_calendar_content, encoding="utf-8")
     
     # Добавляем общий календарь в список
     public_calendars.append(("Все города", public_calendar_url, ""))
     
-    # Генерируем отдельные публичные календари по городам
-    unique_cities = sorted({e.get('city', '').strip() for e in all_events if e.get('city')})
-    for city in unique_cities:
-        city_events = [e for e in all_events if e.get('city') == city]
-        city_slug = make_slug(city)
-        city_filename = f"onevents-public-{city_slug}.ics"
-        city_url = f"https://onevents.ru/calendar/{city_filename}"
-        city_calendar_name = f"События 1С. {city} - OnEvents"
-        
-        city_calendar_content = generate_public_calendar(
-            city_events,
-            calendar_name=city_calendar_name,
-            wr_url=city_url,
+    # Генерируем отдельные публичные календари по городам.
+    # Список городов берём по всем событиям, чтобы ссылки на календари не пропадали
+    hot_events_by_city = store.by_city(hot_events)
+    for city in store.cities():
+        city_url = write_public_calendar(
+            hot_events_by_city.get(city, []),
+            calendar_dir,
+            f"onevents-public-{make_slug(city)}.ics",
+            f"События 1С. {city} - OnEvents",
+            short_urls, manifest, revisions,
         )
-        (calendar_dir / city_filename).write_text(city_calendar_content, encoding="utf-8")
         
         # Сохраняем информацию о календаре
         public_calendars.append((city, city_url, city))
     
+    # Архивные календари по годам: меняются, только когда в архив уходят новые события.
+    # Их VEVENT больше нигде не нужны, поэтому пишем их потоком, не вытесняя из кэша актуальные события
+    for year in sorted(archive):
+        write_public_calendar(
+            archive[year], calendar_dir, f"onevents-archive-{year}.ics", f"События 1С. Архив {year} - OnEvents",
+            short_urls, manifest, revisions, refresh="P1D", cache=False,
+        )
+    
     return public_calendars
 
+# Функция выбора событий для календаря по запросу
+def select_feed_events(store: EventStore, query: FeedQuery) -> list[Event]:
+    """События среза query в порядке дат: идущие в [start, end], в городах query и с нужным форматом"""
+    # Конец среза включительно; последний представимый день (9999-12-31) сверху не ограничивает
+    end = query.end + timedelta(days=1) if query.end is not None and query.end < date.max else None
+    if query.cities:
+        # Срез каждого города — бинарным поиском по его индексу, затем слияние по дате
+        cities = [city for city in store.cities() if city.casefold() in query.cities]
+        events = list(heapq.merge(*(store.overlapping(query.start, end, city) for city in cities), key=Event.sort_key))
+    else:
+        events = store.overlapping(query.start, end)
+    if query.online is not None:
+        events = [e for e in events if e.online == query.online]
+    return events
+
+# Функция подготовки календаря по запросу
+def render_feed(store: EventStore, query: FeedQuery, short_urls=None, revisions: EventRevisions | None = None):
+    """Возвращает (ETag, части календаря) для среза событий по запросу.
+
+    ETag считается по хешам и ревизиям VEVENT среза, без генерации календаря:
+    на условный запрос с тем же ETag сервис отвечает 304, ничего не рендеря.
+    """
+    revisions = revisions or EventRevisions()
+    events = select_feed_events(store, query)
+    url = f"https://onevents.ru{FEED_PATH}"
+    if query.to_query():
+        url += f"?{query.to_query()}"
+    cities = [city for city in store.cities() if city.casefold() in query.cities] or list(query.cities)
+    calendar_name = f"События 1С. {', '.join(cities)} - OnEvents" if cities else "События 1С - OnEvents"
+    etag = hash_parts(url, calendar_name, *(
+        f"{digest}:{revisions.stamp(uid, digest, event.digest)}"
+        for event in events
+        for uid, _, _, digest in event_vevent_parts(event, short_urls)
+    ))
+    chunks = iter_public_calendar(events, calendar_name, url, short_urls, revisions)
+    return f'"{etag[:32]}"', chunks
+
 # Функция генерации HTML блока публичных календарей
 def render_public_calendars(public_calendars: list[tuple[str, str, str]]):
     """Генерирует HTML блок с публичными календарями"""
@@ -348,59 +662,101 @@ def render_public_calendars(public_calendars: list[tuple[str, str, str]]):
     """
 
 # Функция генерации календаря для события
-def generate_event_calendars(events, calendar_dir):
-    """Генерирует .ics файлы для каждого события"""
+def generate_event_calendars(events, calendar_dir, short_urls=None, manifest: BuildManifest | None = None,
+                             revisions: EventRevisions | None = None):
+    """Генерирует .ics файлы для каждого события
+
+    manifest: манифест сборки; файлы событий, которые не менялись, не пересоздаются
+    revisions: ревизии VEVENT для отметок времени
+    """
     
+    manifest = manifest or BuildManifest()
+    revisions = revisions or EventRevisions()
     for event in events:
         # Генерируем имя файла для .ics
-        safe_title = SAFE_CHARS_PATTERN.sub('', event['title']).strip()
+        safe_title = SAFE_CHARS_PATTERN.sub('', event.title).strip()
         safe_title = DASHES_SPACES_PATTERN.sub('-', safe_title)
-        ics_filename = f"{event['date']}-{safe_title}.ics"
+        ics_filename = f"{event.iso_date}-{safe_title}.ics"
+        
+        # Пропускаем событие, если оно не менялось с прошлой сборки
+        ics_file_path = calendar_dir / ics_filename
+        ics_key = events_key([event], short_urls)
+        if manifest.unchanged(ics_file_path, ics_key):
+            continue
         
         # Генерируем содержимое .ics файла
-        ics_content = generate_ics_content(event)
+        ics_content = iter_ics_content(event, short_urls=short_urls, revisions=revisions)
         
         # Сохраняем .ics файл
-        ics_file_path = calendar_dir / ics_filename
-        ics_file_path.write_text(ics_content, encoding="utf-8")
+        manifest.write_stream(ics_file_path, ics_content, ics_key,
+                              mtime=calendar_timestamp([event], short_urls, revisions))
+
+# Функция генерации логотипа события
+def render_logo(e: Event, thumbnail: Thumbnail | None = None) -> str:
+    """Генерирует разметку логотипа: <picture> с WebP и srcset для 1x/2x, если есть миниатюры"""
+    alt = f"Логотип «{e.title}»"
+    style = "border-radius:50%; object-fit:cover;"
+    if thumbnail is None:
+        icon = e.icon
+        return (f'<img class="logo-img" alt="{alt}" src="img/{icon}" width="72" height="72" '
+                f'loading="lazy" decoding="async" style="{style}">')
+
+    srcset = f' srcset="{thumbnail.srcset}"' if thumbnail.srcset else ""
+    img = (f'<img class="logo-img" alt="{alt}" src="{thumbnail.src}"{srcset} '
+           f'width="{thumbnail.width}" height="{thumbnail.height}" loading="lazy" decoding="async" style="{style}">')
+    if not thumbnail.webp_srcset:
+        return img
+    return f'<picture><source type="image/webp" srcset="{thumbnail.webp_srcset}">{img}</picture>'
 
 # Функция генерации карточки
-def render_event(e):
-    date_obj = datetime.strptime(e['date'], "%Y-%m-%d")
-    date_str = date_str = format_date(date_obj, format="d MMMM y", locale="ru")  # 15 сентября 2025
+def render_event(e: Event, images: dict[str, Thumbnail] | None = None, today: date | None = None):
+    """Генерирует HTML карточки события
+
+    images: миниатюры логотипов {icon: Thumbnail}; без них используется исходный файл из img/
+    today: для начавшейся серии показываем ближайшее повторение, а не первое
+    """
+    shown_date = e.next_date(today) if today else e.date
+    date_str = format_ru_date(shown_date, "d MMMM y")  # 15 сентября 2025
     
     
-    if len(e['address']) == 0:
-      address_str  = e['city']
+    if len(e.address) == 0:
+      address_str  = e.city
     else:
-      address_str  = e['city'] + ", "  + e['address']
+      address_str  = e.city + ", "  + e.address
     
     # Генерируем имя файла для .ics
-    safe_title = SAFE_CHARS_PATTERN.sub('', e['title']).strip()
+    safe_title = SAFE_CHARS_PATTERN.sub('', e.title).strip()
     safe_title = DASHES_SPACES_PATTERN.sub('-', safe_title)
-    ics_filename = f"{e['date']}-{safe_title}.ics"
+    ics_filename = f"{e.iso_date}-{safe_title}.ics"
     
     # Добавляем UTM метки к ссылке регистрации
-    registration_url_with_utm = add_utm_marks(e['registration_url'])
+    registration_url_with_utm = add_utm_marks(e.registration_url)
     
     # Добавляем ссылку на карту
-    map_url = map_link(e['city'], e['address'])
+    map_url = map_link(e.city, e.address)
     map_link_html = ""
     if map_url:
         map_link_html = f' <a href="{map_url}" target="_blank" class="map-link" title="Показать на карте">Показать на карте</a>'
+    
+    # Для серии показываем, до какого дня она повторяется
+    recurrence_html = ""
+    if e.recurrence:
+        recurrence_html = f"""
+          <div class="meta-item">
+            <span class="icon">🔁</span>
+            <span>Повторяется до <time itemprop="endDate" datetime="{e.last_date.isoformat()}">{format_ru_date(e.last_date, "d MMMM y")}</time></span>
+          </div>"""
  
     return f"""
-    <article class="card" itemscope itemtype="https://schema.org/Event"  data-city="{e['city']}">
+    <article class="card" itemscope itemtype="https://schema.org/Event"  data-city="{e.city}">
       <div class="card-header" style="display:flex; align-items:flex-start; gap:1em;">
-        <img class="logo-img" alt="Логотип «{e['title']}»" 
-             src="img/{e['icon']}" width="72" height="72" 
-             style="border-radius:50%; object-fit:cover;">
+        {render_logo(e, (images or {}).get(e.icon))}
         <div class="event-info">
-          <h2 class="card-title" itemprop="name" style="margin:0 0 .25em 0;">{e['title']}</h2>
+          <h2 class="card-title" itemprop="name" style="margin:0 0 .25em 0;">{e.title}</h2>
           <div class="meta-item">
             <span class="icon">📅</span>
-            <time itemprop="startDate" datetime="{e['date']}">{date_str}</time>
-          </div>
+            <time itemprop="startDate" datetime="{shown_date.isoformat()}">{date_str}</time>
+          </div>{recurrence_html}
           <div class="meta-item">
             <span class="icon">📍</span>
             <span itemprop="location" itemscope itemtype="https://schema.org/Place">
@@ -409,40 +765,572 @@ def render_event(e):
           </div>{map_link_html}
         </div>
       </div>
-      <p>{e['description']}</p>
+      <p>{e.description}</p>
       <a href="{registration_url_with_utm}" role="button" target="_blank">Регистрация</a>
       <a href="calendar/{ics_filename}" role="button" download="{ics_filename}" style="margin-left:0.5rem;">Добавить в календарь</a>
     </article>
     """
 
-# Создаем папку site при необходимости
-OUTPUT_DIR.mkdir(exist_ok=True)
+# Кэш готовых карточек {(отпечаток события, миниатюра логотипа, показанная дата): HTML}
+CARD_CACHE_SIZE = 100_000
+_card_cache: dict[tuple[str, Thumbnail | None, date], str] = {}
 
-# Копируем картинки
-shutil.copytree("img", "site/img", dirs_exist_ok=True)
+# Функция получения карточки события
+def event_card(e: Event, images: dict[str, Thumbnail] | None = None, today: date | None = None) -> str:
+    """Возвращает HTML карточки события, вычисляя его один раз для каждого содержимого"""
+    key = (e.digest, (images or {}).get(e.icon), e.next_date(today) if today else e.date)
+    card = _card_cache.get(key)
+    if card is None:
+        card = render_event(e, images, today)
+        if len(_card_cache) >= CARD_CACHE_SIZE:
+            # Вытесняем самую старую запись
+            del _card_cache[next(iter(_card_cache))]
+        _card_cache[key] = card
+    return card
 
-# Копируем Иконки
-shutil.copytree("icons", "site/icons", dirs_exist_ok=True)
+@dataclass
+class Page:
+    """Страница сайта с подборкой карточек событий"""
+    filename: str
+    title: str
+    events: list
+    city: str = ""    # страница города
+    month: str = ""   # страница месяца в формате YYYY-MM
+    number: int = 0   # номер страницы в списке «Все города»
 
-# Создаем календари
-calendar_dir = OUTPUT_DIR / "calendar"
-calendar_dir.mkdir(exist_ok=True)
 
-generate_event_calendars(events, calendar_dir)
-public_calendars = generate_public_calendars(all_events, calendar_dir)
+# Функции имён файлов страниц
+def all_page_filename(number: int) -> str:
+    """Имя файла страницы списка «Все города» (первая страница — главная)"""
+    return "index.html" if number == 1 else f"page-{number}.html"
 
-# Генерируем HTML
-events_html = "\n".join(render_event(e) for e in events)
-public_calendars_html = render_public_calendars(public_calendars)
+def city_page_filename(city: str) -> str:
+    """Имя файла страницы города"""
+    return f"city-{make_slug(city)}.html"
+
+def month_page_filename(month: str) -> str:
+    """Имя файла страницы месяца"""
+    return f"month-{month}.html"
+
+# Функция подготовки списка страниц
+def plan_pages(store: EventStore, today: date, page_size: int = PAGE_SIZE) -> list[Page]:
+    """Раскладывает будущие события по страницам: «Все города» с пагинацией, города и месяцы"""
+
+    events = store.upcoming(today)
+    pages = []
+    chunks = [events[i:i + page_size] for i in range(0, len(events), page_size)] or [[]]
+    for number, chunk in enumerate(chunks, start=1):
+        title = "OnEvents" if number == 1 else f"OnEvents — страница {number}"
+        pages.append(Page(all_page_filename(number), title, chunk, number=number))
+
+    for city in store.cities():
+        city_events = store.upcoming(today, city)
+        if city_events:
+            pages.append(Page(city_page_filename(city), f"OnEvents — {city}", city_events, city=city))
+
+    events_by_month = {}
+    for event in events:
+        # Начавшаяся серия попадает в месяц ближайшего повторения
+        month = event.month if event.date >= today else event.next_date(today).isoformat()[:7]
+        events_by_month.setdefault(month, []).append(event)
+    for month, month_events in sorted(events_by_month.items()):
+        title = f"OnEvents — {format_ru_date(datetime.strptime(month, '%Y-%m'), 'LLLL y')}"
+        pages.append(Page(month_page_filename(month), title, month_events, month=month))
+
+    return pages
+
+# Функция генерации списка городов для переключателя
+def render_city_options(cities, current_city: str = "") -> str:
+    """Генерирует <option> со ссылками на страницы городов"""
+    options = ['<option value="index.html">Все города</option>']
+    for city in cities:
+        selected = " selected" if city == current_city else ""
+        options.append(f'<option value="{city_page_filename(city)}"{selected}>{city}</option>')
+    return "\n        ".join(options)
+
+# Функция генерации навигации по месяцам
+def render_month_nav(months, current_month: str = "") -> str:
+    """Генерирует ссылки на страницы месяцев"""
+    if not months:
+        return ""
+    links = []
+    for month in months:
+        current = ' aria-current="page"' if month == current_month else ""
+        label = format_ru_date(datetime.strptime(month, "%Y-%m"), "LLLL y")
+        links.append(f'<a href="{month_page_filename(month)}"{current}>{label}</a>')
+    return f'<nav class="page-nav" aria-label="Месяцы">{"".join(links)}</nav>'
+
+# Функция генерации пагинации
+def render_pagination(total: int, current: int = 0) -> str:
+    """Генерирует ссылки на страницы списка «Все города»"""
+    if total <= 1:
+        return ""
+    links = []
+    for number in range(1, total + 1):
+        attrs = ' aria-current="page"' if number == current else ""
+        links.append(f'<a href="{all_page_filename(number)}"{attrs}>{number}</a>')
+    return f'<nav class="page-nav" aria-label="Страницы">{"".join(links)}</nav>'
+
+# Функция генерации страниц сайта
+def generate_pages(store: EventStore, today: date, template: str, output_dir: Path, public_calendars, images=None,
+                   builddate: str = "", manifest: BuildManifest | None = None,
+                   page_size: int = PAGE_SIZE) -> list[Page]:
+    """Генерирует главную, страницы пагинации, городов и месяцев из одних и тех же карточек
+
+    today: события, начинающиеся раньше этой даты, на страницы не попадают
+    manifest: манифест сборки; страницы с неизменными входами не пересоздаются
+    """
+
+    manifest = manifest or BuildManifest()
+    pages = plan_pages(store, today, page_size)
+    cities = [p.city for p in pages if p.city]
+    months = [p.month for p in pages if p.month]
+    total = sum(1 for p in pages if p.number)
+
+    for page in pages:
+        page_path = Path(output_dir) / page.filename
+        page_key = events_key(page.events, None, template, builddate, public_calendars, images,
+                              page, cities, months, total, today)
+        if manifest.unchanged(page_path, page_key):
+            continue
+
+        # Карточки рендерим один раз и переиспользуем на всех страницах и между сборками
+        events_html = "\n".join(event_card(e, images, today) for e in page.events)
+
+        # На странице города показываем только общий календарь и календарь города
+        page_calendars = [c for c in public_calendars if not page.city or c[2] in ("", page.city)]
+
+        # Подставляем в шаблон
+        result_html = (
+            template
+            .replace("{{ page_title }}", page.title)
+            .replace("{{ city_options }}", render_city_options(cities, page.city))
+            .replace("{{ month_nav }}", render_month_nav(months, page.month))
+            .replace("{{ events }}", events_html)
+            .replace("{{ pagination }}", render_pagination(total, page.number))
+            .replace("{{ public_calendars }}", render_public_calendars(page_calendars))
+            .replace("{{ builddate }}", builddate)
+        )
+
+        # Сохраняем результат
+        manifest.write(page_path, result_html, page_key)
+
+    return pages
+
+# Функция генерации поискового индекса
+def generate_event_index(events, output_dir: Path, manifest: BuildManifest | None = None,
+                         today: date | None = None) -> int:
+    """Сохраняет компактный индекс событий events.json и возвращает его размер в байтах
+
+    today: начавшиеся серии попадают в индекс датой ближайшего повторения
+    """
+    manifest = manifest or BuildManifest()
+    index_path = Path(output_dir) / "events.json"
+    index_key = events_key(events, None, "events.json", today)
+    if not manifest.unchanged(index_path, index_key):
+        index = build_event_index(events, link=lambda e: add_utm_marks(e.registration_url), today=today)
+        content = json.dumps(index, ensure_ascii=False, separators=(",", ":"))
+        manifest.write(index_path, content, index_key)
+    return index_path.stat().st_size
+
+# Кэш хешей календарей последней сборки {путь: ((ctime, mtime, размер), sha256)}
+_feed_digest_cache: dict[str, tuple[tuple[int, int, int], str]] = {}
+
+# Функция вычисления хеша календаря
+def feed_digest(path: Path, stat) -> str:
+    """sha256 файла календаря; не перечитывает файл, который не менялся с прошлой сборки"""
+    version = (stat.st_ctime_ns, stat.st_mtime_ns, stat.st_size)
+    cached = _feed_digest_cache.get(str(path))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    _feed_digest_cache[str(path)] = (version, digest)
+    return digest
+
+# Функция генерации манифеста календарей
+def generate_feed_manifest(calendar_dir: Path, output_dir: Path, manifest: BuildManifest,
+                           revisions: EventRevisions | None = None) -> int:
+    """Сохраняет feeds.json с ETag, размером и временем изменения каждого календаря сборки.
+
+    Время изменения файла календаря берётся из ревизий, а не из времени сборки, поэтому
+    ETag вида "mtime-size" (так его считает nginx) не меняется, пока не меняется содержимое.
+    Возвращает число календарей в манифесте.
+    """
+    revisions = revisions or EventRevisions()
+    feeds = {}
+    for path in manifest.outputs():
+        if path.parent != Path(calendar_dir) or path.suffix != ".ics":
+            continue
+        stat = path.stat()
+        mtime = int(stat.st_mtime)
+        feeds[path.name] = {
+            "etag": f'"{mtime:x}-{stat.st_size:x}"',
+            "size": stat.st_size,
+            "last_modified": formatdate(mtime, usegmt=True),
+            "sha256": feed_digest(path, stat),
+        }
+    # Календари, которых больше нет в сборке, из кэша хешей убираем
+    current = {str(Path(calendar_dir) / name) for name in feeds}
+    for stale in _feed_digest_cache.keys() - current:
+        del _feed_digest_cache[stale]
+
+    content = json.dumps({"version": 1, "feeds": feeds}, ensure_ascii=False, indent=1, sort_keys=True)
+    manifest_path = Path(output_dir) / "feeds.json"
+    key = hash_parts(content)
+    manifest.write(manifest_path, content, key, mtime=revisions.feed_stamp(manifest_path.name, key))
+    return len(feeds)
+
+# Функция сборки сайта
+def build(events_dir: Path = EVENTS_DIR, output_dir: Path = OUTPUT_DIR, options: BuildOptions | None = None,
+          state: BuildState | None = None) -> dict:
+    """Собирает сайт из событий events_dir в каталог output_dir и возвращает сводку сборки
+
+    state: состояние прошлой сборки в этом же процессе (резидентный режим); с ним
+           заново разбираются только изменённые файлы событий, а кэши не читаются с диска
+    """
+
+    options = options or BuildOptions()
+    output_dir = Path(output_dir)
+    stats = BuildStats()
+
+    with stats.stage("load_events"):
+        # Загружаем шаблон
+        template = Path(options.template_file).read_text(encoding="utf-8")
+
+        # Загружаем события
+        store = load_events(events_dir, options.events_snapshot, options.workers,
+                            parsed=state.parsed if state is not None else None)
+        today = options.today or date.today()
+        events = store.upcoming(today)  # будущие события для карточек/индивидуальных .ics
+
+    if state is not None and state.manifest is not None:
+        # Резидентный режим: всё нужное уже в памяти
+        url_cache = state.url_cache
+        revisions = state.revisions
+        revisions.now = int(time.time())
+        manifest = state.manifest.restart(stats)
+    else:
+        # Кэш коротких ссылок между сборками
+        url_cache = UrlCache(options.url_cache, ttl=options.url_cache_ttl, max_entries=options.url_cache_size).load()
+
+        # Ревизии VEVENT: отметки времени меняются только вместе с содержимым событий
+        revisions = EventRevisions(options.revisions_file).load()
+
+        # Манифест прошлой сборки для инкрементальной пересборки
+        manifest = BuildManifest(options.manifest_file, output_dir, stats=stats)
+        if not options.full_rebuild:
+            manifest.load()
+
+        if state is not None:
+            state.url_cache, state.revisions, state.manifest = url_cache, revisions, manifest
+
+    # Создаем папку site при необходимости
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with stats.stage("images"):
+        # Готовим миниатюры только для логотипов отображаемых событий
+        images = build_thumbnails(
+            (e.icon for e in events),
+            options.img_dir,
+            output_dir / "img",
+            manifest,
+            cache_dir=options.thumbnail_cache,
+        )
+
+        # Копируем Иконки
+        manifest.copy_tree(options.icons_dir, output_dir / "icons")
+
+    with stats.stage("shorten_urls"):
+        # Сокращаем все уникальные ссылки на карты одним пакетом
+        short_urls = shorten_urls(
+            (map_link(e.city, e.address) for e in store),
+            cache=url_cache,
+            offline=options.offline,
+            endpoint=options.shortener_url,
+            concurrency=options.shortener_concurrency,
+            deadline=options.shortener_deadline,
+            stats=stats,
+        )
+
+    # Создаем календари
+    calendar_dir = output_dir / "calendar"
+    calendar_dir.mkdir(exist_ok=True)
+
+    with stats.stage("event_calendars"):
+        generate_event_calendars(events, calendar_dir, short_urls=short_urls, manifest=manifest, revisions=revisions)
+    with stats.stage("public_calendars"):
+        # Старые события уходят из оперативных календарей в годовые архивы
+        feed_since = None
+        if options.feed_window is not None:
+            feed_since = today - timedelta(days=options.feed_window)
+        public_calendars = generate_public_calendars(store, calendar_dir, short_urls=short_urls,
+                                                     manifest=manifest, revisions=revisions, since=feed_since)
+        # ETag и размеры календарей для условных запросов
+        feeds = generate_feed_manifest(calendar_dir, output_dir, manifest, revisions)
+
+    with stats.stage("html"):
+        # Генерируем страницы; неизменные пропускаются по манифесту
+        today_date_str = format_ru_date(today, "d MMMM y")
+        pages = generate_pages(
+            store,
+            today,
+            template,
+            output_dir,
+            public_calendars,
+            images=images,
+            builddate=today_date_str,
+            manifest=manifest,
+            page_size=options.page_size,
+        )
+
+    with stats.stage("search_index"):
+        index_bytes = generate_event_index(events, output_dir, manifest, today)
+
+    if options.precompress:
+        with stats.stage("compress"):
+            # Сжимаем текстовые файлы заранее для gzip_static/brotli_static
+            precompress(manifest, workers=options.workers)
+
+    with stats.stage("finalize"):
+        # Удаляем файлы, которые больше не создаются, и сохраняем манифест
+        manifest.remove_stale()
+        manifest.save()
+
+        # Сохраняем кэш коротких ссылок и ревизии событий (без ревизий удалённых событий и календарей)
+        url_cache.save()
+        revisions.prune(e.digest for e in store)
+        revisions.save()
+
+    return {
+        "events": len(store),
+        "upcoming_events": len(events),
+        "pages": len(pages),
+        "feeds": feeds,
+        "index_bytes": index_bytes,
+        "url_cache_hits": url_cache.hits,
+        "url_cache_misses": url_cache.misses,
+        "url_cache_entries": len(url_cache),
+        "files_written": manifest.written,
+        "files_unchanged": manifest.skipped,
+        "files_removed": manifest.removed,
+        "stats": stats,
+    }
+
+
+# Функция локального сервера с пересборкой при изменениях
+def serve(events_dir: Path = EVENTS_DIR, output_dir: Path = OUTPUT_DIR, options: BuildOptions | None = None,
+          host: str = "127.0.0.1", port: int = 8000, watch: bool = True, interval: float = DEFAULT_INTERVAL):
+    """Собирает сайт и раздаёт его по HTTP; с watch следит за исходниками и пересобирает сайт.
+
+    Разобранные события, карточки и VEVENT остаются в памяти, поэтому правка одного
+    события заново разбирает только его файл и перезаписывает только зависящие от него файлы.
+    Открытые страницы перезагружаются сами после каждой пересборки.
+    """
+    options = options or BuildOptions()
+    state = BuildState()
+    build(events_dir, output_dir, options, state)
+
+    server = DevServer((host, port), output_dir)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Сайт доступен по адресу http://{host}:{server.server_port}/ (Ctrl+C — остановить)")
+
+    sources = [events_dir, options.img_dir, options.icons_dir, options.template_file]
+    watcher = PollingWatcher(sources, interval) if watch else None
+    try:
+        while True:
+            if watcher is None:
+                time.sleep(3600)
+                continue
+            changed = watcher.wait()
+            started = time.perf_counter()
+            try:
+                summary = build(events_dir, output_dir, options, state)
+            except Exception as error:
+                # Ошибка в описании события не должна останавливать сервер
+                print(f"Ошибка сборки: {error}")
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"Пересобрано за {elapsed:.0f} мс: изменено исходников {len(changed)}, "
+                  f"записано файлов {summary['files_written']}, удалено {summary['files_removed']}")
+            server.live_reload.notify()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# Функция запуска сервиса календарей по запросу
+def serve_feeds(events_dir: Path = EVENTS_DIR, options: BuildOptions | None = None, host: str = "127.0.0.1",
+                port: int = 8000, interval: float = DEFAULT_INTERVAL, cache_bytes: int = DEFAULT_CACHE_BYTES):
+    """Раздаёт календари со срезами событий по запросу /calendar.ics?city=&from=&to=&online=.
+
+    События разбираются один раз и держатся в памяти; готовые ответы кэшируются
+    (LRU, не больше cache_bytes). При изменении events/ события перечитываются
+    (только изменённые файлы), а кэш сбрасывается. Короткие ссылки берутся только
+    из кэша, ревизии — из файла последней сборки. На диск пишется только устаревший
+    снимок событий при запуске; при перечитывании событий сервис ничего не пишет.
+    """
+    import asyncio
+    from utils.feedserver import FeedServer
+
+    options = options or BuildOptions()
+    parsed = {}
+    url_cache = UrlCache(options.url_cache, ttl=options.url_cache_ttl, max_entries=options.url_cache_size).load()
+    revisions = EventRevisions(options.revisions_file).load()
+
+    def load(snapshot_file=None):
+        # Снимок нужен только для быстрого запуска, дальше разобранные файлы держатся в parsed
+        store = load_events(events_dir, snapshot_file, options.workers, parsed=parsed)
+        short_urls = shorten_urls((map_link(e.city, e.address) for e in store), cache=url_cache, offline=True)
+        return store, short_urls
+
+    store, short_urls = load(options.events_snapshot)
+    server = FeedServer(
+        lambda query: render_feed(store, query, short_urls, revisions),
+        cache=ResponseCache(cache_bytes),
+        window_days=options.feed_window,
+        today=(lambda: options.today) if options.today else None,
+    )
+
+    async def run():
+        nonlocal store, short_urls
+        listener = await server.start(host, port)
+        address = listener.sockets[0].getsockname()
+        print(f"Календари доступны по адресу http://{address[0]}:{address[1]}{FEED_PATH}?city=... (Ctrl+C — остановить)")
+        watcher = PollingWatcher([events_dir], interval)
+        async with listener:
+            while True:
+                await asyncio.sleep(interval)
+                changed = await asyncio.to_thread(watcher.poll)
+                if not changed:
+                    continue
+                revisions.now = int(time.time())
+                try:
+                    store, short_urls = await asyncio.to_thread(load)
+                except Exception as error:
+                    # Ошибка в описании события не должна останавливать сервис: отдаём прежние события
+                    print(f"Ошибка загрузки событий: {error}")
+                    continue
+                server.invalidate()
+                print(f"События перечитаны: изменено файлов {len(changed)}, событий {len(store)}")
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+# Функция разбора параметров командной строки
+def parse_args(argv=None):
+    """Разбирает параметры командной строки"""
+    parser = argparse.ArgumentParser(description="Сборка сайта OnEvents")
+    parser.add_argument("command", nargs="?", choices=("build", "serve", "feeds"), default="build",
+                        help="build — собрать сайт (по умолчанию), serve — собрать и раздать локально, "
+                             "feeds — сервис календарей по запросу")
+    parser.add_argument("--watch", action="store_true",
+                        help="в режиме serve пересобирать сайт при изменении событий, картинок и шаблона")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="адрес локального сервера в режимах serve и feeds")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="порт локального сервера в режимах serve и feeds")
+    parser.add_argument("--feed-cache-mb", type=float, default=DEFAULT_CACHE_BYTES / 1024 / 1024,
+                        help="размер кэша готовых календарей в режиме feeds, МБ")
+    parser.add_argument("--events-dir", type=Path, default=EVENTS_DIR,
+                        help="каталог с описаниями событий")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="каталог для собранного сайта")
+    parser.add_argument("--offline", action="store_true",
+                        help="не обращаться к сети, короткие ссылки брать только из кэша")
+    parser.add_argument("--url-cache", type=Path, default=DEFAULT_CACHE_FILE,
+                        help="файл кэша коротких ссылок")
+    parser.add_argument("--url-cache-ttl", type=float, default=DEFAULT_CACHE_TTL / 86400,
+                        help="время жизни записи кэша коротких ссылок, дней")
+    parser.add_argument("--url-cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="максимальное число записей в кэше коротких ссылок")
+    parser.add_argument("--shortener-url", default=SHORTENER_URL,
+                        help="адрес сервиса сокращения ссылок")
+    parser.add_argument("--shortener-concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="число одновременных запросов к сервису сокращения ссылок")
+    parser.add_argument("--shortener-deadline", type=float, default=DEFAULT_DEADLINE,
+                        help="общий лимит времени на сокращение ссылок, секунд")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST_FILE,
+                        help="файл манифеста для инкрементальной сборки")
+    parser.add_argument("--full", action="store_true",
+                        help="полная пересборка без учёта манифеста")
+    parser.add_argument("--events-snapshot", type=Path, default=DEFAULT_SNAPSHOT_FILE,
+                        help="файл снимка разобранных событий")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="число процессов для разбора событий")
+    parser.add_argument("--thumbnail-cache", type=Path, default=DEFAULT_THUMBNAIL_CACHE,
+                        help="каталог кэша миниатюр логотипов")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help="число карточек на странице «Все города»")
+    parser.add_argument("--precompress", action="store_true",
+                        help="писать сжатые копии .gz и .br для отдачи через gzip_static/brotli_static")
+    parser.add_argument("--revisions", type=Path, default=DEFAULT_REVISIONS_FILE,
+                        help="файл ревизий событий для стабильных DTSTAMP/LAST-MODIFIED/SEQUENCE")
+    parser.add_argument("--feed-window", type=int, default=FEED_WINDOW_DAYS,
+                        help="сколько дней прошедшие события остаются в общем и городских календарях "
+                             "(более старые уходят в годовые архивы; отрицательное значение — без архива)")
+    parser.add_argument("--profile", action="store_true",
+                        help="вывести время стадий, сетевые вызовы и объём записанных файлов")
+    parser.add_argument("--stats-json", type=Path, default=None,
+                        help="сохранить статистику сборки в JSON-файл")
+    parser.add_argument("--cprofile", type=Path, default=None,
+                        help="сохранить профиль cProfile сборки в файл")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Точка входа командной строки: python create_web.py или python -m create_web"""
+    args = parse_args(argv)
+    options = BuildOptions(
+        offline=args.offline,
+        url_cache=args.url_cache,
+        url_cache_ttl=args.url_cache_ttl * 86400,
+        url_cache_size=args.url_cache_size,
+        shortener_url=args.shortener_url,
+        shortener_concurrency=args.shortener_concurrency,
+        shortener_deadline=args.shortener_deadline,
+        manifest_file=args.manifest,
+        full_rebuild=args.full,
+        events_snapshot=args.events_snapshot,
+        workers=args.workers,
+        thumbnail_cache=args.thumbnail_cache,
+        page_size=args.page_size,
+        precompress=args.precompress,
+        revisions_file=args.revisions,
+        feed_window=args.feed_window if args.feed_window >= 0 else None,
+    )
+    if args.command == "serve":
+        serve(args.events_dir, args.output_dir, options, host=args.host, port=args.port, watch=args.watch)
+        return
+    if args.command == "feeds":
+        serve_feeds(args.events_dir, options, host=args.host, port=args.port,
+                    cache_bytes=int(args.feed_cache_mb * 1024 * 1024))
+        return
+    if args.cprofile:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        summary = profiler.runcall(build, args.events_dir, args.output_dir, options)
+        profiler.dump_stats(args.cprofile)
+        if args.profile:
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    else:
+        summary = build(args.events_dir, args.output_dir, options)
+    print(f"Событий: {summary['events']}, будущих: {summary['upcoming_events']}, страниц: {summary['pages']}, "
+          f"календарей: {summary['feeds']}, "
+          f"поисковый индекс: {summary['index_bytes']} байт")
+    print(f"Кэш коротких ссылок: попаданий {summary['url_cache_hits']}, "
+          f"промахов {summary['url_cache_misses']}, записей {summary['url_cache_entries']}")
+    print(f"Файлов записано: {summary['files_written']}, без изменений: {summary['files_unchanged']}, "
+          f"удалено: {summary['files_removed']}")
+    if args.profile:
+        print(summary["stats"].format())
+    if args.stats_json:
+        summary["stats"].write_json(args.stats_json)
 
-# Подставляем в шаблон
-today_date_str = format_date(date.today(), format="d MMMM y", locale="ru")
-result_html = (
-    template
-    .replace("{{ events }}", events_html)
-    .replace("{{ public_calendars }}", public_calendars_html)
-    .replace("{{ builddate }}", today_date_str)
-)
 
-# Сохраняем результат
-OUTPUT_FILE.write_text(result_html, encoding="utf-8")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,394 @@
-from create_web import clean_text, to_hhmmss
+import gzip
+import json
+import re
+import shutil
+import subprocess
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+
+import create_web
+from create_web import clean_text, make_slug, to_hhmmss, build, render_logo, BuildOptions, BuildState
+from bench.corpus import generate_corpus
+from bench.stub_shortener import StubShortener
+from utils.images import build_thumbnails
+from utils import loader
+from utils.loader import load_event_files
+from utils.model import Event
+from utils.manifest import BuildManifest
+
+EVENT_YML = """title: "Тестовое событие"
+date: "2030-01-15"
+city: "Москва"
+address: "ул. Арбат, 12"
+icon: "default.jpg"
+description: "Описание события"
+registration_url: "https://example.com/register"
+"""
+
+def make_options(tmp_path, **kwargs):
+    (tmp_path / "img").mkdir(exist_ok=True)
+    (tmp_path / "img" / "default.jpg").write_bytes(b"jpg")
+    (tmp_path / "icons").mkdir(exist_ok=True)
+    return BuildOptions(
+        template_file=Path("web/index.html"),
+        img_dir=tmp_path / "img",
+        icons_dir=tmp_path / "icons",
+        today=date(2030, 1, 1),
+        offline=True,
+        url_cache=tmp_path / "urls.json",
+        manifest_file=None,
+        events_snapshot=None,
+        revisions_file=tmp_path / "revisions.json",
+        thumbnail_cache=tmp_path / "thumbnails",
+        **kwargs,
+    )
+
+def write_events(tmp_path, **files):
+    events_dir = tmp_path / "events"
+    events_dir.mkdir(exist_ok=True)
+    for name, text in files.items():
+        (events_dir / f"{name}.yml").write_text(text, encoding="utf-8")
+    return events_dir
 
 def test_clean_text():
     assert clean_text("<br>") == ""
     assert clean_text("<a>hello</a>") == "hello"
 
 def test_to_hhmmss():
-    assert to_hhmmss("22:00") == "220000"
\ No newline at end of file
+    assert to_hhmmss("22:00") == "220000"
+
+def test_import_is_lazy():
+    code = "import sys, create_web; assert 'babel.dates' not in sys.modules and 'requests' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+def test_build(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    output_dir = tmp_path / "site"
+    summary = build(events_dir, output_dir, make_options(tmp_path))
+
+    assert summary["events"] == 1
+    assert "Тестовое событие" in (output_dir / "index.html").read_text(encoding="utf-8")
+    assert (output_dir / "calendar" / "2030-01-15-Тестовое-событие.ics").exists()
+    assert (output_dir / "calendar" / "onevents-public-москва.ics").exists()
+    assert len(list((output_dir / "img").glob("default-*.jpg"))) == 1
+
+def test_incremental_build(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML, other=EVENT_YML.replace("Тестовое", "Другое"))
+    output_dir = tmp_path / "site"
+    options = make_options(tmp_path)
+    options.manifest_file = tmp_path / "manifest.json"
+    build(events_dir, output_dir, options)
+
+    event_ics = output_dir / "calendar" / "2030-01-15-Тестовое-событие.ics"
+    other_ics = output_dir / "calendar" / "2030-01-15-Другое-событие.ics"
+    stat = event_ics.stat()
+    summary = build(events_dir, output_dir, options)
+    assert summary["files_written"] == 0
+    assert event_ics.stat().st_mtime_ns == stat.st_mtime_ns
+
+    (events_dir / "other.yml").unlink()
+    summary = build(events_dir, output_dir, options)
+    assert not other_ics.exists()
+    assert event_ics.stat().st_mtime_ns == stat.st_mtime_ns
+    assert summary["files_removed"] == 1
+
+def test_load_event_files_snapshot(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    snapshot = tmp_path / "snapshot.pickle"
+    assert load_event_files(events_dir, snapshot_file=snapshot)[0].title == "Тестовое событие"
+    assert snapshot.exists()
+
+    (events_dir / "event.yml").write_text(EVENT_YML.replace("Тестовое", "Новое"), encoding="utf-8")
+    assert load_event_files(events_dir, snapshot_file=snapshot)[0].title == "Новое событие"
+
+def test_load_event_files_validation(tmp_path):
+    events_dir = write_events(tmp_path, broken=EVENT_YML.replace("2030-01-15", "15.01.2030"))
+    with pytest.raises(ValueError, match="broken.yml"):
+        load_event_files(events_dir)
+
+    (events_dir / "broken.yml").unlink()
+    series_dir = write_events(tmp_path, series=EVENT_YML + """recurrence:
+  rrule: "FREQ=WEEKLY"
+  start_time: "10:00"
+  end_time: "12:00"
+""")
+    with pytest.raises(ValueError, match="некорректное описание повторения"):
+        load_event_files(series_dir)
+
+def test_vevents_rendered_once(tmp_path, monkeypatch):
+    sessions_yml = EVENT_YML + """sessions:
+  - date: "2030-01-16"
+    start_time: "10:00"
+    end_time: "18:00"
+  - date: "2030-01-15"
+    start_time: "9:00"
+    end_time: "17:00"
+"""
+    events_dir = write_events(tmp_path, event=sessions_yml)
+    calls = []
+    original = create_web.generate_event_vevent
+    monkeypatch.setattr(create_web, "generate_event_vevent", lambda *a, **kw: calls.append(a) or original(*a, **kw))
+    create_web.clear_vevent_cache()
+
+    build(events_dir, tmp_path / "site", make_options(tmp_path))
+    assert len(calls) == 2
+    # Сессии упорядочены при загрузке, событие при генерации не меняется
+    assert [session.date.isoformat() for _, session, _ in calls] == ["2030-01-15", "2030-01-16"]
+
+def test_synthetic_corpus_builds(tmp_path):
+    generate_corpus(tmp_path / "events", count=20, multi_session_share=0.5, cities=3)
+    summary = build(tmp_path / "events", tmp_path / "site", make_options(tmp_path))
+    assert summary["events"] == 20
+
+def test_build_stats(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    options = make_options(tmp_path)
+    options.offline = False
+    with StubShortener() as stub:
+        options.shortener_url = stub.endpoint
+        stats = build(events_dir, tmp_path / "site", options)["stats"].to_dict()
+
+    assert stats["calls"]["shorten_url"]["calls"] == 1
+    assert {"load_events", "shorten_urls", "public_calendars", "html"} <= stats["stages"].keys()
+    assert stats["outputs"]["event_ics"]["files"] == 1
+    assert stats["outputs"]["html"]["bytes"] > 0
+
+def test_build_thumbnails(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (400, 300), "red").save(tmp_path / "logo.png")
+    cache_dir = tmp_path / "cache"
+    manifest = BuildManifest()
+
+    images = build_thumbnails(["logo.png", "logo.png", "missing.png"], tmp_path, tmp_path / "site", manifest, cache_dir)
+    assert list(images) == ["logo.png"]
+    thumbnail = images["logo.png"]
+    assert thumbnail.webp_srcset.endswith("-144.webp 2x")
+    with Image.open(tmp_path / "site" / thumbnail.src.removeprefix("img/")) as image:
+        assert image.size == (72, 72)
+    assert len(list(cache_dir.iterdir())) == 4
+
+    html = render_logo(Event(title="Событие", date=date(2030, 1, 15), city="Москва", icon="logo.png"), thumbnail)
+    assert '<source type="image/webp"' in html and 'loading="lazy"' in html
+
+def test_build_sharded_pages(tmp_path):
+    events_dir = write_events(
+        tmp_path,
+        msk=EVENT_YML,
+        spb=EVENT_YML.replace("Москва", "Санкт-Петербург").replace("Тестовое", "Питерское"),
+        feb=EVENT_YML.replace("2030-01-15", "2030-02-01").replace("Тестовое", "Февральское"),
+    )
+    output_dir = tmp_path / "site"
+    options = make_options(tmp_path)
+    options.page_size = 2
+    summary = build(events_dir, output_dir, options)
+
+    assert summary["pages"] == 6  # 2 страницы «Все города», 2 города, 2 месяца
+    city_page = (output_dir / "city-санкт-петербург.html").read_text(encoding="utf-8")
+    assert "Питерское событие" in city_page and "Тестовое событие" not in city_page
+    assert '<option value="city-санкт-петербург.html" selected>' in city_page
+    month_page = (output_dir / "month-2030-02.html").read_text(encoding="utf-8")
+    assert "Февральское событие" in month_page and "Питерское событие" not in month_page
+    assert '<a href="page-2.html">2</a>' in (output_dir / "index.html").read_text(encoding="utf-8")
+
+def test_build_precompress(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    output_dir = tmp_path / "site"
+    options = make_options(tmp_path)
+    options.precompress = True
+    options.manifest_file = tmp_path / "manifest.json"
+    build(events_dir, output_dir, options)
+
+    index = output_dir / "index.html"
+    assert gzip.decompress((output_dir / "index.html.gz").read_bytes()) == index.read_bytes()
+    assert (output_dir / "calendar" / "onevents-public.ics.gz").exists()
+    assert not list((output_dir / "img").glob("*.gz"))
+
+    gz_mtime = (output_dir / "index.html.gz").stat().st_mtime_ns
+    build(events_dir, output_dir, options)
+    assert (output_dir / "index.html.gz").stat().st_mtime_ns == gz_mtime
+
+def test_feeds_are_deterministic(tmp_path):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    site = tmp_path / "site"
+    build(events_dir, site, make_options(tmp_path))
+    feeds = sorted((site / "calendar").glob("*.ics"))
+    first = {f.name: (f.read_bytes(), f.stat().st_mtime) for f in feeds}
+    manifest = json.loads((site / "feeds.json").read_text(encoding="utf-8"))
+
+    # Новая сборка «с нуля» даёт те же байты и то же время изменения
+    shutil.rmtree(site)
+    build(events_dir, site, make_options(tmp_path))
+    assert {f.name: (f.read_bytes(), f.stat().st_mtime) for f in feeds} == first
+    assert json.loads((site / "feeds.json").read_text(encoding="utf-8")) == manifest
+
+    public = first["onevents-public.ics"][0].decode("utf-8")
+    assert "SEQUENCE:0" in public
+    feed = manifest["feeds"]["onevents-public.ics"]
+    assert feed["size"] == len(first["onevents-public.ics"][0])
+    assert feed["etag"] == f'"{int(first["onevents-public.ics"][1]):x}-{feed["size"]:x}"'
+
+    # Изменение описания увеличивает SEQUENCE, UID не меняется
+    write_events(tmp_path, event=EVENT_YML.replace("Описание события", "Новое описание"))
+    build(events_dir, site, make_options(tmp_path))
+    updated = (site / "calendar" / "onevents-public.ics").read_text(encoding="utf-8")
+    assert "SEQUENCE:1" in updated
+    assert re.findall(r"UID:[^\r\n]*", updated) == re.findall(r"UID:[^\r\n]*", public)
+
+def test_feed_timestamp_advances_when_event_leaves(tmp_path, monkeypatch):
+    events_dir = write_events(
+        tmp_path, first=EVENT_YML, second=EVENT_YML.replace("Тестовое", "Другое"),
+    )
+    site = tmp_path / "site"
+    monkeypatch.setattr("time.time", lambda: 1_900_000_000.0)
+    build(events_dir, site, make_options(tmp_path))
+    public = site / "calendar" / "onevents-public.ics"
+    assert int(public.stat().st_mtime) == 1_900_000_000
+
+    # Событие удалено: календарь стал меньше, и время его изменения обязано вырасти
+    (events_dir / "second.yml").unlink()
+    monkeypatch.setattr("time.time", lambda: 1_900_000_100.0)
+    build(events_dir, site, make_options(tmp_path))
+    assert int(public.stat().st_mtime) == 1_900_000_100
+    assert "LAST-MODIFIED:20300317T174820Z" in public.read_text(encoding="utf-8").split("BEGIN:VEVENT")[0]
+
+    # В кэше хешей календарей остаются только календари текущей сборки
+    feeds = json.loads((site / "feeds.json").read_text(encoding="utf-8"))["feeds"]
+    assert set(create_web._feed_digest_cache) == {str(site / "calendar" / name) for name in feeds}
+    assert not any("Другое" in path for path in create_web._feed_digest_cache)
+
+    # Ревизия удалённого события не остаётся в файле ревизий навсегда
+    revisions = json.loads((tmp_path / "revisions.json").read_text(encoding="utf-8"))
+    assert len(revisions["events"]) == 1
+
+def test_feed_unchanged_when_only_generator_changes(tmp_path, monkeypatch):
+    events_dir = write_events(tmp_path, event=EVENT_YML)
+    site = tmp_path / "site"
+    monkeypatch.setattr("time.time", lambda: 1_900_000_000.0)
+    build(events_dir, site, make_options(tmp_path))
+    feeds = {path.name: (path.read_bytes(), path.stat().st_mtime) for path in (site / "calendar").glob("onevents-*.ics")}
+    assert feeds
+
+    # Правка кода, не меняющая календари, пересобирает их, но не меняет ни байты, ни время изменения
+    monkeypatch.setattr(create_web, "generator_fingerprint", lambda: "другой код")
+    monkeypatch.setattr("time.time", lambda: 1_900_000_100.0)
+    build(events_dir, site, make_options(tmp_path))
+    assert {path.name: (path.read_bytes(), path.stat().st_mtime)
+            for path in (site / "calendar").glob("onevents-*.ics")} == feeds
+
+def test_recurring_event_is_one_master_vevent(tmp_path):
+    series_yml = EVENT_YML + """recurrence:
+  rrule: "FREQ=WEEKLY;COUNT=10"
+  start_time: "9:00"
+  end_time: "12:00"
+  exdate: ["2030-01-29"]
+  overrides:
+    - date: "2030-02-05"
+      start_time: "10:00"
+      end_time: "13:00"
+"""
+    events_dir = write_events(tmp_path, event=series_yml)
+    site = tmp_path / "site"
+    build(events_dir, site, make_options(tmp_path))
+    public = (site / "calendar" / "onevents-public.ics").read_bytes().decode("utf-8")
+
+    assert public.count("BEGIN:VEVENT") == 2
+    assert "RRULE:FREQ=WEEKLY;COUNT=10\r\n" in public
+    assert "DTSTART:20300115T090000\r\n" in public
+    assert "EXDATE:20300129T090000\r\n" in public
+    assert "RECURRENCE-ID:20300205T090000\r\nDTSTART:20300205T100000\r\n" in public
+    uids = re.findall(r"UID:[^\r\n]*", public)
+    assert len(set(uids)) == 1
+
+    # Серия и её изменённое повторение ведут ревизии раздельно: повторная сборка не меняет SEQUENCE
+    build(events_dir, site, make_options(tmp_path))
+    assert (site / "calendar" / "onevents-public.ics").read_bytes().decode("utf-8") == public
+    assert public.count("SEQUENCE:0") == 2
+
+def test_started_series_shown_at_next_occurrence(tmp_path):
+    series_yml = EVENT_YML + """recurrence:
+  rrule: "FREQ=MONTHLY;COUNT=6"
+  start_time: "9:00"
+  end_time: "12:00"
+"""
+    events_dir = write_events(tmp_path, event=series_yml)
+    site = tmp_path / "site"
+    options = make_options(tmp_path)
+    options.today = date(2030, 4, 1)
+    build(events_dir, site, options)
+
+    # Карточка и поисковый индекс показывают то же повторение, по которому серия разложена по месяцам
+    month_page = (site / "month-2030-04.html").read_text(encoding="utf-8")
+    assert '<time itemprop="startDate" datetime="2030-04-15">15 апреля 2030</time>' in month_page
+    index = json.loads((site / "events.json").read_text(encoding="utf-8"))
+    assert list(index["postings"]["month"]) == ["2030-04"]
+    assert index["events"]["day"] == [(date(2030, 4, 15) - date(1970, 1, 1)).days]
+
+def test_public_feeds_window_and_archive(tmp_path):
+    events_dir = write_events(
+        tmp_path,
+        upcoming=EVENT_YML,
+        recent=EVENT_YML.replace("2030-01-15", "2029-12-20").replace("Тестовое", "Недавнее"),
+        old=EVENT_YML.replace("2030-01-15", "2028-03-01").replace("Москва", "Казань").replace("Тестовое", "Старое"),
+    )
+    site = tmp_path / "site"
+    build(events_dir, site, make_options(tmp_path))
+    calendar_dir = site / "calendar"
+
+    public = (calendar_dir / "onevents-public.ics").read_text(encoding="utf-8")
+    assert public.count("BEGIN:VEVENT") == 2
+    assert "Старое" not in public
+
+    archive = (calendar_dir / "onevents-archive-2028.ics").read_text(encoding="utf-8")
+    assert archive.count("BEGIN:VEVENT") == 1
+    assert "Старое" in archive
+
+    # Календарь города без свежих событий остаётся по прежней ссылке, но пустой
+    assert "BEGIN:VEVENT" not in (calendar_dir / f"onevents-public-{make_slug('Казань')}.ics").read_text(encoding="utf-8")
+
+    # Без окна все события остаются в общем календаре, архивов нет
+    build(events_dir, tmp_path / "full", make_options(tmp_path, feed_window=None))
+    assert not list((tmp_path / "full" / "calendar").glob("onevents-archive-*.ics"))
+    assert (tmp_path / "full" / "calendar" / "onevents-public.ics").read_text(encoding="utf-8").count("BEGIN:VEVENT") == 3
+
+def test_resident_rebuild_touches_only_affected_outputs(tmp_path, monkeypatch):
+    events_dir = write_events(
+        tmp_path,
+        first=EVENT_YML,
+        second=EVENT_YML.replace("2030-01-15", "2030-02-20").replace("Тестовое", "Второе"),
+    )
+    options = make_options(tmp_path)
+    state = BuildState()
+    build(events_dir, tmp_path / "site", options, state)
+
+    parsed = []
+    original = loader.parse_event_file
+    monkeypatch.setattr(loader, "parse_event_file", lambda path: parsed.append(path) or original(path))
+    assert build(events_dir, tmp_path / "site", options, state)["files_written"] == 0
+
+    write_events(tmp_path, second=EVENT_YML.replace("2030-01-15", "2030-02-20").replace("Тестовое", "Изменённое"))
+    summary = build(events_dir, tmp_path / "site", options, state)
+    assert parsed == [events_dir / "second.yml"]
+    # Календарь и страницы первого события не перезаписываются
+    written = summary["stats"].outputs
+    assert written["event_ics"]["files"] == 1
+    assert (tmp_path / "site" / "calendar" / "2030-02-20-Изменённое-событие.ics").exists()
+    assert not (tmp_path / "site" / "calendar" / "2030-02-20-Второе-событие.ics").exists()
+
+def test_vevent_cache_bounded_by_memory(tmp_path, monkeypatch):
+    create_web.clear_vevent_cache()
+    events = [Event.from_dict({"title": f"Митап {i}", "date": "2030-01-15", "city": "Москва"}) for i in range(3)]
+    size = create_web.vevent_parts_size(create_web.event_vevent_parts(events[0]))
+    monkeypatch.setattr(create_web, "VEVENT_CACHE_BYTES", size * 2)
+    create_web.event_vevent_parts(events[1])
+    create_web.event_vevent_parts(events[0])  # недавно использованное событие не вытесняется
+    create_web.event_vevent_parts(events[2])
+    assert [key[0] for key in create_web._vevent_cache] == [events[0].digest, events[2].digest]
+
+    # Блоки архивных календарей в кэш не попадают
+    archived = Event.from_dict({"title": "Старый митап", "date": "2020-01-15", "city": "Москва"})
+    create_web.event_vevent_parts(archived, cache=False)
+    assert len(create_web._vevent_cache) == 2
+    create_web.clear_vevent_cache()
@@ -0,0 +1,34 @@
+import threading
+import urllib.request
+
+from utils.devserver import DevServer, LIVE_RELOAD_SCRIPT
+from utils.watch import PollingWatcher
+
+
+def test_polling_watcher_reports_changed_files(tmp_path):
+    (tmp_path / "a.yml").write_text("a", encoding="utf-8")
+    watcher = PollingWatcher([tmp_path], interval=0.01)
+    assert watcher.poll() == set()
+
+    (tmp_path / "a.yml").write_text("changed", encoding="utf-8")
+    (tmp_path / "b.yml").write_text("b", encoding="utf-8")
+    assert watcher.wait(timeout=1) == {tmp_path / "a.yml", tmp_path / "b.yml"}
+
+    (tmp_path / "b.yml").unlink()
+    assert watcher.poll() == {tmp_path / "b.yml"}
+
+
+def test_dev_server_injects_live_reload(tmp_path):
+    (tmp_path / "index.html").write_text("<html><body>OnEvents</body></html>", encoding="utf-8")
+    (tmp_path / "events.json").write_text("{}", encoding="utf-8")
+    server = DevServer(("127.0.0.1", 0), tmp_path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base = f"http://127.0.0.1:{server.server_port}"
+        with urllib.request.urlopen(base + "/") as response:
+            assert LIVE_RELOAD_SCRIPT in response.read().decode("utf-8")
+        with urllib.request.urlopen(base + "/events.json") as response:
+            assert response.read() == b"{}"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,83 @@
+import asyncio
+import urllib.error
+import urllib.request
+from datetime import date
+
+import pytest
+
+from create_web import render_feed
+from utils.feeds import FeedQuery, ResponseCache
+from utils.feedserver import FeedServer
+from utils.model import Event, EventStore
+
+
+def test_feed_query_normalization():
+    today = date(2030, 1, 1)
+    query = FeedQuery.parse("city=Москва,online&from=today&to=%2B30&utm_source=tg", today)
+    assert query == FeedQuery.parse("to=2030-01-31&city=ONLINE&city=москва&from=2030-01-01", today)
+    assert query.cities == ("online", "москва")
+    assert FeedQuery.parse("online=да", today, default_start=date(2029, 10, 1)).start == date(2029, 10, 1)
+    with pytest.raises(ValueError):
+        FeedQuery.parse("from=2030-02-01&to=2030-01-01", today)
+    with pytest.raises(ValueError):
+        FeedQuery.parse("online=maybe", today)
+    for bad in ("to=%2B3000000", "to=99999999999", "from=-99999999"):
+        with pytest.raises(ValueError):
+            FeedQuery.parse(bad, today)
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=10)
+    first, second, third = FeedQuery(("a",)), FeedQuery(("b",)), FeedQuery(("c",))
+    cache.put(first, '"1"', b"aaaa")
+    cache.put(second, '"2"', b"bbbb")
+    assert cache.get(first) == ('"1"', b"aaaa")
+    cache.put(third, '"3"', b"cccc")
+    assert cache.get(second) is None
+    assert len(cache) == 2 and cache.size == 8
+
+
+def test_feed_server_filters_caches_and_revalidates():
+    store = EventStore([
+        Event.from_dict({"title": "Митап", "date": "2030-01-15", "city": "Москва"}),
+        Event.from_dict({"title": "Вебинар", "date": "2030-01-20", "city": "Online"}),
+        Event.from_dict({"title": "Конференция", "date": "2030-03-01", "city": "Казань"}),
+    ])
+    server = FeedServer(lambda query: render_feed(store, query), today=lambda: date(2030, 1, 1))
+
+    def get(url, etag=""):
+        request = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read().decode("utf-8")
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers, ""
+
+    async def scenario():
+        listener = await server.start("127.0.0.1", 0)
+        base = f"http://127.0.0.1:{listener.sockets[0].getsockname()[1]}/calendar.ics"
+        async with listener:
+            status, headers, body = await asyncio.to_thread(get, base + "?online=0&to=%2B30")
+            assert status == 200 and headers["X-Cache"] == "MISS"
+            assert headers["Transfer-Encoding"] == "chunked"
+            assert "Митап" in body and "Вебинар" not in body and "Конференция" not in body
+
+            # Тот же срез в другой записи берётся из кэша
+            status, headers, cached = await asyncio.to_thread(get, base + "?to=2030-01-31&online=no&utm=1")
+            assert (status, headers["X-Cache"], cached) == (200, "HIT", body)
+
+            etag = headers["ETag"]
+            assert (await asyncio.to_thread(get, base + "?online=0&to=%2B30", etag))[0] == 304
+
+            # После смены событий кэш сброшен, но неизменный срез сохраняет ETag
+            server.invalidate()
+            status, headers, _ = await asyncio.to_thread(get, base + "?online=0&to=%2B30")
+            assert (headers["X-Cache"], headers["ETag"]) == ("MISS", etag)
+
+            assert (await asyncio.to_thread(get, base + "?from=bad"))[0] == 400
+            assert (await asyncio.to_thread(get, base + "?to=%2B3000000"))[0] == 400
+            status, _, body = await asyncio.to_thread(get, base + "?to=9999-12-31")
+            assert status == 200 and "Конференция" in body
+            assert (await asyncio.to_thread(get, base.replace("calendar.ics", "other.ics")))[0] == 404
+
+    asyncio.run(scenario())
@@ -0,0 +1,18 @@
+from utils.ics import CRLF, escape_text, fold_line, fold_lines
+
+
+def test_escape_text():
+    assert escape_text("a,b;c\\d\ne") == "a\\,b\\;c\\\\d\\ne"
+
+
+def test_fold_line_keeps_utf8_characters_whole():
+    line = "DESCRIPTION:" + "Событие 1С " * 20
+    folded = fold_line(line)
+    parts = folded.encode("utf-8").split(CRLF.encode())
+    assert all(len(part) <= 75 for part in parts)
+    assert all(part.startswith(b" ") for part in parts[1:])
+    assert folded.replace(CRLF + " ", "") == line
+
+
+def test_fold_lines_uses_crlf():
+    assert fold_lines("BEGIN:VEVENT\nEND:VEVENT") == "BEGIN:VEVENT\r\nEND:VEVENT\r\n"
@@ -0,0 +1,105 @@
+import pickle
+from datetime import date
+
+import pytest
+
+from utils.model import Event, EventStore
+from utils.recurrence import RecurrenceRule
+
+
+def make_event(day: str, city: str = "Москва", title: str = "Митап", **kwargs) -> Event:
+    return Event.from_dict({"title": title, "date": day, "city": city, **kwargs})
+
+
+def test_event_from_dict_normalizes_sessions():
+    event = make_event("2030-01-15", sessions=[
+        {"date": "2030-01-16", "start_time": "9:00", "end_time": "18:00"},
+        {"date": "2030-01-15", "start_time": "10.30", "end_time": "17:00"},
+    ])
+    assert [s.date for s in event.sessions] == [date(2030, 1, 15), date(2030, 1, 16)]
+    assert event.sessions[0].start == "103000"
+    assert event.last_date == date(2030, 1, 16)
+
+
+def test_event_snapshot_roundtrip_keeps_digest_and_interning():
+    event = make_event("2030-01-15", city="".join(["Моск", "ва"]))
+    restored = pickle.loads(pickle.dumps(event))
+    assert restored == event
+    assert restored.digest == event.digest
+    assert restored.city is make_event("2030-02-01", city="Москва").city
+
+
+def test_event_store_range_and_city_queries():
+    store = EventStore([
+        make_event("2030-03-01", city="Казань"),
+        make_event("2030-01-15"),
+        make_event("2030-02-01"),
+        make_event("2029-12-31", city="Казань"),
+    ])
+    assert [e.iso_date for e in store] == ["2029-12-31", "2030-01-15", "2030-02-01", "2030-03-01"]
+    assert [e.iso_date for e in store.upcoming(date(2030, 1, 15))] == ["2030-01-15", "2030-02-01", "2030-03-01"]
+    assert [e.iso_date for e in store.between(date(2030, 1, 1), date(2030, 2, 1))] == ["2030-01-15"]
+    assert store.cities() == ["Казань", "Москва"]
+    assert [e.iso_date for e in store.in_city("Казань", date(2030, 1, 1))] == ["2030-03-01"]
+    assert store.in_city("Омск") == []
+
+    # Многодневное событие попадает в срез, пока идёт хотя бы одна его сессия
+    festival = make_event("2030-01-30", city="Казань", title="Фестиваль", sessions=[
+        {"date": "2030-01-30", "start_time": "10:00", "end_time": "18:00"},
+        {"date": "2030-02-02", "start_time": "10:00", "end_time": "18:00"},
+    ])
+    store = EventStore([*store, festival])
+    assert [e.title for e in store.overlapping(date(2030, 2, 1), date(2030, 3, 2), "Казань")] == ["Фестиваль", "Митап"]
+    assert [e.iso_date for e in store.overlapping(date(2030, 2, 1))] == ["2030-01-30", "2030-02-01", "2030-03-01"]
+    assert store.overlapping(date(2030, 2, 3), city="Москва") == []
+
+
+def test_recurrence_rule_expansion():
+    monthly = RecurrenceRule.parse("FREQ=MONTHLY;BYDAY=2SA;COUNT=3")
+    assert monthly.expand(date(2030, 1, 12)) == [date(2030, 1, 12), date(2030, 2, 9), date(2030, 3, 9)]
+    weekly = RecurrenceRule.parse({"freq": "weekly", "byday": "TU,TH", "until": "2030-01-10"})
+    assert weekly.expand(date(2030, 1, 1)) == [date(2030, 1, 1), date(2030, 1, 3), date(2030, 1, 8), date(2030, 1, 10)]
+    assert weekly.to_ics() == "FREQ=WEEKLY;UNTIL=20300110T235959;BYDAY=TU,TH"
+    assert RecurrenceRule.parse("FREQ=MONTHLY;BYMONTHDAY=-1;COUNT=2").expand(date(2030, 1, 31)) == [
+        date(2030, 1, 31), date(2030, 2, 28)]
+    # BYDAY вместе с BYMONTHDAY ограничивает дни, а не добавляет их: пятница, 13-е
+    assert RecurrenceRule.parse("FREQ=MONTHLY;BYDAY=FR;BYMONTHDAY=13;COUNT=3").expand(date(2026, 2, 13)) == [
+        date(2026, 2, 13), date(2026, 3, 13), date(2026, 11, 13)]
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse("FREQ=WEEKLY")  # бесконечная серия
+
+
+def test_event_recurrence_dates_and_store():
+    series = make_event("2030-01-12", title="Завтрак", recurrence={
+        "rrule": "FREQ=MONTHLY;BYDAY=2SA;COUNT=4",
+        "start_time": "11:00",
+        "end_time": "13:00",
+        "rdate": ["2030-05-01"],
+        "exdate": ["2030-02-09"],
+        "overrides": [{"date": "2030-03-09", "start_time": "12:00"}],
+    })
+    assert series.recurrence_dates == (date(2030, 1, 12), date(2030, 3, 9), date(2030, 4, 13), date(2030, 5, 1))
+    assert series.last_date == date(2030, 5, 1)
+    assert series.next_date(date(2030, 2, 1)) == date(2030, 3, 9)
+    assert pickle.loads(pickle.dumps(series)).digest == series.digest
+    # Одна дата или даты через запятую вместо списка
+    scalar = make_event("2030-01-12", title="Завтрак", recurrence={
+        "rrule": "FREQ=MONTHLY;BYDAY=2SA;COUNT=4", "start_time": "11:00", "end_time": "13:00",
+        "rdate": "2030-05-01", "exdate": date(2030, 2, 9),
+        "overrides": [{"date": "2030-03-09", "start_time": "12:00"}],
+    })
+    assert scalar.recurrence_dates == series.recurrence_dates
+
+    # Начавшаяся серия остаётся среди будущих событий, пока у неё есть повторения
+    store = EventStore([series, make_event("2030-03-01")])
+    assert [e.title for e in store.upcoming(date(2030, 2, 1))] == ["Завтрак", "Митап"]
+    assert [e.title for e in store.upcoming(date(2030, 2, 1), "Москва")] == ["Завтрак", "Митап"]
+    assert [e.title for e in store.upcoming(date(2030, 5, 2))] == []
+
+    with pytest.raises(ValueError):
+        make_event("2030-01-13", recurrence={"rrule": "FREQ=MONTHLY;BYDAY=2SA;COUNT=4",
+                                             "start_time": "11:00", "end_time": "13:00"})
+    with pytest.raises(ValueError):
+        make_event("2030-01-12", recurrence={"rrule": "FREQ=MONTHLY;BYDAY=2SA;COUNT=4",
+                                             "start_time": "11:00", "end_time": "13:00",
+                                             "overrides": [{"date": "2030-01-13"}]})
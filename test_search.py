@@ -0,0 +1,46 @@
+import json
+import re
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from utils.model import Event
+from utils.search import build_event_index, tokenize
+
+
+def test_tokenize_folds_russian_case():
+    assert tokenize("Ёлка и <b>Митап</b> 1С") == ["елка", "митап", "1с"]
+
+
+def test_build_event_index():
+    events = [
+        {"title": "Митап 1С", "date": "2030-01-15", "city": "Москва", "icon": "a.png", "description": "Доклады"},
+        {"title": "Конференция", "date": "2030-02-01", "city": "Москва", "icon": "a.png", "description": "Митап"},
+        {"title": "Завтрак", "date": "2030-02-03", "city": "Казань", "icon": "b.png", "description": ""},
+    ]
+    index = build_event_index([Event.from_dict(e) for e in events])
+    assert index["cities"] == ["Москва", "Казань"]
+    assert index["icons"] == ["a.png", "b.png"]
+    assert index["events"]["day"][0] == 21929
+    assert index["postings"]["token"]["митап"] == [0, 1]
+    assert index["postings"]["month"]["2030-02"] == [1, 2]
+    assert index["postings"]["city"]["1"] == [2]
+
+
+def test_page_query_tokens_match_index():
+    # Запрос на странице разбивается так же, как текст при индексации: служебных слов в индексе нет
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("нет node")
+    template = (Path(__file__).parent / "web/index.html").read_text(encoding="utf-8")
+    functions = re.findall(r"^\s*(function (?:normalize|tokens)\(s\)\{.*\})$", template, re.MULTILINE)
+    assert len(functions) == 2
+    index = build_event_index([Event.from_dict({"title": "Конференция для разработчиков", "date": "2030-01-15", "city": "Москва"})])
+    query = "Конференция для Ёлки и разработчиков"
+    script = (f"const stopWords = new Set({json.dumps(index['stop_words'])});\n" + "\n".join(functions)
+              + f"\nconsole.log(JSON.stringify(tokens({json.dumps(query)})));")
+    result = subprocess.run([node, "-e", script], capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == tokenize(query) == ["конференция", "елки", "разработчиков"]
+    assert "для" not in index["postings"]["token"]
@@ -0,0 +1,82 @@
+import time
+
+import requests
+
+from bench.stub_shortener import StubShortener
+from utils import shortener
+from utils.shortener import UrlCache, shorten_url, shorten_urls
+
+
+def test_url_cache_lru_and_persistence(tmp_path, monkeypatch):
+    path = tmp_path / "urls.json"
+    cache = UrlCache(path, max_entries=2)
+    cache.set("a", "short-a")
+    cache.set("b", "short-b")
+    assert cache.get("a") == "short-a"
+    cache.set("c", "short-c")  # вытесняет "b"
+    assert cache.get("b") is None
+    cache.save()
+
+    loaded = UrlCache(path, max_entries=2).load()
+    assert loaded.get("a") == "short-a"
+    assert loaded.get("c") == "short-c"
+    assert (loaded.hits, loaded.misses) == (2, 0)
+
+    # Те же обращения в том же порядке не меняют LRU, и файл не переписывается
+    writes = []
+    monkeypatch.setattr(shortener, "write_atomic", lambda *args: writes.append(args))
+    loaded.save()
+    assert writes == []
+    loaded.get("a")
+    loaded.save()
+    assert len(writes) == 1
+
+
+def test_url_cache_skips_malformed_entries(tmp_path):
+    path = tmp_path / "urls.json"
+    path.write_text('{"version":1,"entries":[["a","b"],["c","short-c",1],[1,2,3],["d","e","x"]]}', encoding="utf-8")
+    cache = UrlCache(path, ttl=None).load()
+    assert len(cache) == 1 and cache.get("c") == "short-c"
+
+
+def test_url_cache_ttl(tmp_path):
+    cache = UrlCache(tmp_path / "urls.json", ttl=-1)
+    cache.set("a", "short-a")
+    assert cache.get("a") is None
+    assert cache.get("a", allow_stale=True) == "short-a"
+
+
+def test_shorten_url_offline_never_uses_network(monkeypatch, tmp_path):
+    def fail(*args, **kwargs):
+        raise AssertionError("network call")
+    monkeypatch.setattr(requests, "get", fail)
+
+    cache = UrlCache(tmp_path / "urls.json")
+    cache.set("https://example.com/a", "https://clck.ru/a")
+    assert shorten_url("https://example.com/a", cache=cache, offline=True) == "https://clck.ru/a"
+    assert shorten_url("https://example.com/b", cache=cache, offline=True) == "https://example.com/b"
+
+
+def test_shorten_urls_deduplicates_and_runs_concurrently():
+    with StubShortener(latency=0.2) as stub:
+        urls = [f"https://example.com/{i}" for i in range(4)] * 10
+        started = time.monotonic()
+        result = shorten_urls(urls, endpoint=stub.endpoint, concurrency=4)
+        elapsed = time.monotonic() - started
+    assert sorted(stub.calls) == sorted(set(urls))
+    assert len(result) == 4
+    assert elapsed < 0.6
+
+
+def test_shorten_urls_deadline_falls_back_to_raw_url():
+    with StubShortener(latency=1) as stub:
+        result = shorten_urls(["https://example.com/slow"], endpoint=stub.endpoint, deadline=0.2)
+    assert result == {"https://example.com/slow": "https://example.com/slow"}
+
+
+def test_shorten_urls_keeps_stale_link_when_service_fails(tmp_path):
+    cache = UrlCache(tmp_path / "urls.json", ttl=-1)
+    cache.set("https://example.com/slow", "https://clck.ru/old")
+    with StubShortener(latency=1) as stub:
+        result = shorten_urls(["https://example.com/slow"], cache=cache, endpoint=stub.endpoint, deadline=0.2)
+    assert result == {"https://example.com/slow": "https://clck.ru/old"}
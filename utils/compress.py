@@ -0,0 +1,75 @@
+# onevents/utils/compress.py
+
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from utils.manifest import hash_parts
+
+# Какие файлы сжимаем заранее
+COMPRESSIBLE_SUFFIXES = frozenset({".html", ".ics", ".json", ".svg", ".webmanifest", ".css", ".js", ".xml", ".txt"})
+
+# С какого числа файлов сжимаем их в пуле процессов
+PARALLEL_THRESHOLD = 16
+
+
+def _load_brotli():
+    """Возвращает модуль brotli или None, если он не установлен"""
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compress_data(data: bytes, use_brotli: bool = True) -> dict[str, bytes]:
+    """Сжимает данные в gzip и (если доступен) brotli: {".gz": ..., ".br": ...}"""
+    # mtime=0, чтобы одинаковый вход давал одинаковый .gz
+    result = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    brotli = _load_brotli() if use_brotli else None
+    if brotli is not None:
+        result[".br"] = brotli.compress(data, quality=11)
+    return result
+
+
+def _compress_file(path: str, use_brotli: bool) -> dict[str, bytes]:
+    return compress_data(Path(path).read_bytes(), use_brotli)
+
+
+def precompress(manifest, workers: int | None = None, use_brotli: bool = True) -> int:
+    """Пишет рядом с текстовыми файлами текущей сборки сжатые копии .gz и .br.
+
+    Копии для файлов, содержимое которых не менялось, не пересжимаются (по манифесту).
+    Возвращает число сжатых файлов.
+    """
+    suffixes = [".gz"] + ([".br"] if use_brotli and _load_brotli() is not None else [])
+
+    pending = []
+    # Сжимаем только файлы текущей сборки: устаревшие будут удалены и не должны оставлять копий
+    for file in manifest.outputs():
+        if file.suffix not in COMPRESSIBLE_SUFFIXES or not file.is_file():
+            continue
+        mtime = file.stat().st_mtime
+        key = hash_parts(file.read_bytes(), mtime, *suffixes)
+        targets = [file.with_name(file.name + suffix) for suffix in suffixes]
+        if all(manifest.unchanged(target, key) for target in targets):
+            continue
+        pending.append((file, key, mtime))
+
+    if len(pending) >= PARALLEL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(pending) // ((workers or os.cpu_count() or 1) * 4))
+            compressed = list(executor.map(
+                _compress_file, [str(file) for file, _, _ in pending], [use_brotli] * len(pending),
+                chunksize=chunksize,
+            ))
+    else:
+        compressed = [_compress_file(str(file), use_brotli) for file, _, _ in pending]
+
+    for (file, key, mtime), variants in zip(pending, compressed):
+        for suffix, data in variants.items():
+            # Сжатая копия получает время изменения оригинала: ETag и Last-Modified у них совпадают
+            manifest.write(file.with_name(file.name + suffix), data, key, mtime=mtime)
+
+    return len(pending)
@@ -0,0 +1,107 @@
+# onevents/utils/devserver.py
+
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# Адрес потока событий автообновления страницы
+LIVE_RELOAD_PATH = "/__livereload"
+
+# Скрипт, который перезагружает страницу после пересборки сайта
+LIVE_RELOAD_SCRIPT = (
+    f'<script>new EventSource("{LIVE_RELOAD_PATH}").onmessage = () => location.reload();</script>'
+)
+
+# Как часто держать соединение автообновления живым, секунд
+KEEPALIVE_INTERVAL = 15
+
+
+class LiveReload:
+    """Номер сборки, изменения которого ждут открытые в браузере страницы"""
+
+    def __init__(self):
+        self.version = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        """Сообщает страницам, что сайт пересобран"""
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float | None = None) -> int:
+        """Ждёт сборки новее version и возвращает текущий номер (тот же — по таймауту)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """Раздаёт собранный сайт и добавляет в HTML-страницы скрипт автообновления"""
+
+    def __init__(self, request, client_address, server):
+        super().__init__(request, client_address, server, directory=str(server.directory))
+
+    def log_message(self, format, *args):
+        # Не засоряем консоль строками о каждом запросе
+        pass
+
+    def end_headers(self):
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def do_GET(self):
+        if self.path == LIVE_RELOAD_PATH:
+            self._stream_reloads()
+            return
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if path.endswith(".html") and os.path.isfile(path):
+            self._send_html(path)
+            return
+        super().do_GET()
+
+    def _send_html(self, path: str):
+        with open(path, "rb") as f:
+            content = f.read()
+        script = LIVE_RELOAD_SCRIPT.encode("utf-8")
+        if b"</body>" in content:
+            content = content.replace(b"</body>", script + b"</body>", 1)
+        else:
+            content += script
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _stream_reloads(self):
+        live_reload = self.server.live_reload
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        version = live_reload.version
+        try:
+            while True:
+                current = live_reload.wait(version, timeout=KEEPALIVE_INTERVAL)
+                if current != version:
+                    version = current
+                    self.wfile.write(f"data: {version}\n\n".encode())
+                else:
+                    # Комментарий SSE: держит соединение и замечает закрытую вкладку
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+class DevServer(ThreadingHTTPServer):
+    """Локальный HTTP-сервер для режима serve с автообновлением страниц"""
+
+    daemon_threads = True
+
+    def __init__(self, address, directory, live_reload: LiveReload | None = None):
+        self.directory = directory
+        self.live_reload = live_reload or LiveReload()
+        super().__init__(address, DevRequestHandler)
@@ -0,0 +1,127 @@
+# onevents/utils/feeds.py
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlencode
+
+# Адрес календаря со срезом событий
+FEED_PATH = "/calendar.ics"
+
+# Ограничение кэша готовых ответов по умолчанию, байт
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+TRUE_VALUES = ("1", "true", "yes", "on", "да")
+FALSE_VALUES = ("0", "false", "no", "off", "нет")
+
+
+def parse_feed_date(value: str, today: date) -> date:
+    """Дата из запроса: YYYY-MM-DD, today или смещение в днях от сегодня (+30, -7).
+
+    «+» в строке запроса раскодируется в пробел, поэтому 30 без знака — тоже +30.
+    """
+    value = value.strip().lower()
+    if value == "today":
+        return today
+    if value.lstrip("+-").isdigit():
+        try:
+            return today + timedelta(days=int(value))
+        except OverflowError:
+            raise ValueError(f"смещение вне допустимого диапазона дат: {value}") from None
+    return date.fromisoformat(value)
+
+
+def parse_flag(value: str) -> bool:
+    """Логический параметр запроса: 1/true/yes/да или 0/false/no/нет"""
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"ожидалось 1 или 0, получено {value!r}")
+
+
+@dataclass(frozen=True, slots=True)
+class FeedQuery:
+    """Нормализованный запрос календаря. Разные записи одного среза
+    (порядок и регистр городов, относительные даты, лишние параметры) дают равные запросы."""
+    cities: tuple[str, ...] = ()  # города в нижнем регистре, по алфавиту; пусто — все города
+    start: date | None = None     # события, которые заканчиваются не раньше этого дня
+    end: date | None = None       # и начинаются не позже этого дня
+    online: bool | None = None    # True — только онлайн, False — только очные, None — все
+
+    @classmethod
+    def parse(cls, query: str, today: date, default_start: date | None = None) -> "FeedQuery":
+        """Разбирает строку запроса city=...&from=...&to=...&online=...
+
+        Город можно передать несколькими параметрами city или через запятую.
+        Без from срез начинается с default_start. Неизвестные параметры (например,
+        UTM-метки) игнорируются, чтобы не дробить кэш. Некорректные значения — ValueError.
+        """
+        params = parse_qs(query)
+        cities = sorted({
+            city.strip().casefold()
+            for value in params.get("city", ())
+            for city in value.split(",")
+            if city.strip()
+        })
+        try:
+            start = parse_feed_date(params["from"][-1], today) if "from" in params else default_start
+            end = parse_feed_date(params["to"][-1], today) if "to" in params else None
+        except ValueError:
+            raise ValueError("from и to — даты YYYY-MM-DD, today или смещение в днях (+30)") from None
+        if start is not None and end is not None and end < start:
+            raise ValueError("to раньше from")
+        online = parse_flag(params["online"][-1]) if "online" in params else None
+        return cls(tuple(cities), start, end, online)
+
+    def to_query(self) -> str:
+        """Каноническая строка запроса (для X-WR-URL и журналов)"""
+        params = [("city", city) for city in self.cities]
+        if self.start is not None:
+            params.append(("from", self.start.isoformat()))
+        if self.end is not None:
+            params.append(("to", self.end.isoformat()))
+        if self.online is not None:
+            params.append(("online", "1" if self.online else "0"))
+        return urlencode(params)
+
+
+class ResponseCache:
+    """LRU-кэш готовых календарей {запрос: (ETag, тело)}, ограниченный суммарным размером тел"""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[FeedQuery, tuple[str, bytes]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: FeedQuery) -> tuple[str, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: FeedQuery, etag: str, body: bytes):
+        """Запоминает ответ; ответ больше всего кэша не сохраняется"""
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self._entries[key] = (etag, body)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
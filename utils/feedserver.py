@@ -0,0 +1,224 @@
+# onevents/utils/feedserver.py
+
+import asyncio
+from contextlib import suppress
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+from utils.feeds import FEED_PATH, FeedQuery, ResponseCache
+
+# Ограничение на размер строки запроса и заголовков, байт
+MAX_HEADER_BYTES = 16 * 1024
+
+# Сколько ждать следующего запроса в открытом соединении, секунд
+KEEPALIVE_TIMEOUT = 15
+
+# Сколько байт календаря копить перед отправкой очередного фрагмента
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Очередь входящих соединений: бенчмарк открывает тысячу соединений разом
+LISTEN_BACKLOG = 1024
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class FeedServer:
+    """Асинхронный HTTP-сервис календарей по запросу: GET и HEAD /calendar.ics?city=&from=&to=&online=.
+
+    render(query) возвращает (ETag, части календаря). ETag должен вычисляться без
+    генерации календаря: тогда запрос с совпавшим If-None-Match сразу получает 304.
+    Новый срез отдаётся по мере генерации (chunked) и попадает в кэш; одинаковые
+    одновременные запросы ждут первую генерацию, а не запускают свою.
+    """
+
+    def __init__(self, render, cache: ResponseCache | None = None, window_days: int | None = None, today=None):
+        self.render = render
+        self.cache = cache if cache is not None else ResponseCache()
+        self.window_days = window_days
+        self.today = today or date.today
+        self.generation = 0  # растёт при каждой смене событий
+        self._pending: dict[FeedQuery, asyncio.Future] = {}
+
+    def invalidate(self):
+        """Сбрасывает кэш: события изменились"""
+        self.generation += 1
+        self.cache.clear()
+
+    def parse_query(self, query: str) -> FeedQuery:
+        today = self.today()
+        default_start = today - timedelta(days=self.window_days) if self.window_days is not None else None
+        return FeedQuery.parse(query, today, default_start)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractServer:
+        """Открывает порт и возвращает сервер asyncio"""
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=LISTEN_BACKLOG)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обслуживает соединение: запросы HTTP/1.1 подряд, пока клиент держит его открытым"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    break
+                if not await self._respond(head, writer):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _respond(self, head: bytes, writer: asyncio.StreamWriter) -> bool:
+        """Отвечает на один запрос; возвращает, можно ли продолжать соединение"""
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            await self._send(writer, 400, b"bad request line\n", keep_alive=False)
+            return False
+        method, target, version = parts
+        # Браузеры и утилиты иногда шлют кириллицу в адресе без %-кодирования
+        target = target.encode("latin-1").decode("utf-8", "replace")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(":")
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if headers.get("content-length", "0") != "0" or "transfer-encoding" in headers:
+            # Тела у GET и HEAD не ждём: не дочитываем его и закрываем соединение
+            keep_alive = False
+
+        if method not in ("GET", "HEAD"):
+            await self._send(writer, 405, b"method not allowed\n", keep_alive, extra={"Allow": "GET, HEAD"})
+            return keep_alive
+        url = urlsplit(target)
+        if url.path != FEED_PATH:
+            await self._send(writer, 404, b"not found\n", keep_alive)
+            return keep_alive
+        try:
+            query = self.parse_query(url.query)
+        except ValueError as error:
+            await self._send(writer, 400, f"{error}\n".encode("utf-8"), keep_alive)
+            return keep_alive
+
+        head_only = method == "HEAD"
+        if_none_match = headers.get("if-none-match", "")
+        cached = self.cache.get(query)
+        if cached is None and query in self._pending:
+            # Тот же срез уже генерируется: ждём его вместо повторной генерации
+            await asyncio.shield(self._pending[query])
+            cached = self.cache.get(query)
+        if cached is not None:
+            etag, body = cached
+            if etag_matches(if_none_match, etag):
+                await self._send(writer, 304, b"", keep_alive, etag=etag)
+            else:
+                await self._send(writer, 200, body, keep_alive, etag=etag, head_only=head_only, cache="HIT")
+            return keep_alive
+
+        try:
+            etag, chunks = self.render(query)
+        except Exception as error:
+            await self._send(writer, 500, f"{error}\n".encode("utf-8"), keep_alive)
+            return keep_alive
+        if etag_matches(if_none_match, etag):
+            await self._send(writer, 304, b"", keep_alive, etag=etag)
+            return keep_alive
+        if head_only:
+            body = "".join(chunks).encode("utf-8")
+            await self._send(writer, 200, body, keep_alive, etag=etag, head_only=True, cache="MISS")
+            return keep_alive
+        chunked = version == "HTTP/1.1"
+        return await self._stream(writer, query, etag, chunks, keep_alive and chunked, chunked)
+
+    async def _stream(self, writer: asyncio.StreamWriter, query: FeedQuery, etag: str, chunks,
+                      keep_alive: bool, chunked: bool) -> bool:
+        """Отдаёт календарь по мере генерации и кладёт его в кэш.
+
+        Для HTTP/1.1 тело идёт фрагментами (chunked), для HTTP/1.0 — до закрытия соединения.
+        """
+        generation = self.generation
+        pending = asyncio.get_running_loop().create_future()
+        self._pending[query] = pending
+        try:
+            writer.write(self._head(200, etag=etag, keep_alive=keep_alive, cache="MISS",
+                                    length=None if chunked else -1))
+            parts = []
+            buffer = []
+            buffered = 0
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                parts.append(data)
+                buffer.append(data)
+                buffered += len(data)
+                if buffered >= STREAM_CHUNK_BYTES:
+                    await self._write_chunk(writer, b"".join(buffer), chunked)
+                    buffer, buffered = [], 0
+            if buffer:
+                await self._write_chunk(writer, b"".join(buffer), chunked)
+            if chunked:
+                writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            if generation == self.generation:
+                self.cache.put(query, etag, b"".join(parts))
+        finally:
+            del self._pending[query]
+            pending.set_result(None)
+        return keep_alive
+
+    @staticmethod
+    async def _write_chunk(writer: asyncio.StreamWriter, data: bytes, chunked: bool):
+        if chunked:
+            writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+        else:
+            writer.write(data)
+        await writer.drain()
+
+    @staticmethod
+    def _head(status: int, etag: str = "", keep_alive: bool = True, cache: str = "",
+              length: int | None = 0, extra: dict | None = None) -> bytes:
+        """Строка статуса и заголовки; length=None — chunked, -1 — тело до закрытия соединения"""
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        if status in (200, 304):
+            lines.append("Cache-Control: public, max-age=3600, must-revalidate")
+            lines.append(f"ETag: {etag}")
+        if status == 200:
+            lines.append("Content-Type: text/calendar; charset=utf-8")
+        elif status != 304:
+            lines.append("Content-Type: text/plain; charset=utf-8")
+        if length is None:
+            lines.append("Transfer-Encoding: chunked")
+        elif length >= 0 and status != 304:
+            lines.append(f"Content-Length: {length}")
+        if cache:
+            lines.append(f"X-Cache: {cache}")
+        for name, value in (extra or {}).items():
+            lines.append(f"{name}: {value}")
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, body: bytes, keep_alive: bool,
+                    etag: str = "", head_only: bool = False, cache: str = "", extra: dict | None = None):
+        writer.write(self._head(status, etag, keep_alive, cache, len(body), extra))
+        if body and not head_only:
+            writer.write(body)
+        await writer.drain()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Совпадает ли ETag с заголовком If-None-Match (список ETag или *)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
@@ -0,0 +1,46 @@
+# onevents/utils/ics.py
+
+# Разделитель строк и максимальная длина строки по RFC 5545
+CRLF = "\r\n"
+MAX_LINE_OCTETS = 75
+
+# Экранирование значений типа TEXT по RFC 5545 (за один проход)
+TEXT_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    ',': '\\,',
+    ';': '\\;',
+    '\n': '\\n',
+})
+
+
+def escape_text(text) -> str:
+    """Экранирует специальные символы значения TEXT для ICS"""
+    return str(text).translate(TEXT_ESCAPES)
+
+
+def fold_line(line: str) -> str:
+    """Переносит строку длиннее 75 октетов, не разрывая многобайтовые символы UTF-8"""
+    data = line.encode("utf-8")
+    if len(data) <= MAX_LINE_OCTETS:
+        return line
+
+    parts = []
+    start = 0
+    limit = MAX_LINE_OCTETS
+    while len(data) - start > limit:
+        end = start + limit
+        # Не режем посередине символа: байты продолжения UTF-8 имеют вид 10xxxxxx
+        while data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        start = end
+        # Строка продолжения начинается с пробела, он тоже входит в 75 октетов
+        limit = MAX_LINE_OCTETS - 1
+    parts.append(data[start:])
+    return b"\r\n ".join(parts).decode("utf-8")
+
+
+def fold_lines(block: str) -> str:
+    """Превращает блок строк, разделённых \\n, в строки ICS с переносами и CRLF"""
+    return "".join(fold_line(line) + CRLF for line in block.split("\n"))
+
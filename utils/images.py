@@ -0,0 +1,137 @@
+# onevents/utils/images.py
+
+import hashlib
+import io
+from dataclasses import dataclass
+from pathlib import Path
+
+# Размер логотипа в карточке события, пикселей
+THUMBNAIL_SIZE = 72
+# Плотности экрана, для которых готовим миниатюры
+THUMBNAIL_SCALES = (1, 2)
+
+# Каталог кэша готовых миниатюр по умолчанию
+DEFAULT_THUMBNAIL_CACHE = Path(".cache/thumbnails")
+
+# Запасные форматы для браузеров без WebP
+FALLBACK_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+
+
+@dataclass(frozen=True)
+class Thumbnail:
+    """Готовый набор файлов логотипа для разметки <picture>"""
+    src: str
+    srcset: str
+    webp_srcset: str = ""
+    width: int = THUMBNAIL_SIZE
+    height: int = THUMBNAIL_SIZE
+
+
+def source_hash(data: bytes) -> str:
+    """Короткий хеш содержимого для имени файла"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _load_pillow():
+    """Возвращает модули Pillow или None, если он не установлен"""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    return Image, ImageOps
+
+
+def _encode(data: bytes, size: int, image_format: str) -> bytes:
+    """Обрезает изображение до квадрата size×size и кодирует в нужный формат"""
+    Image, ImageOps = _load_pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image_format == "JPEG":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        if image_format == "WEBP":
+            thumbnail.save(buffer, "WEBP", quality=80, method=6)
+        elif image_format == "JPEG":
+            thumbnail.save(buffer, "JPEG", quality=85, optimize=True, progressive=True)
+        else:
+            thumbnail.save(buffer, image_format, optimize=True)
+        return buffer.getvalue()
+
+
+def _cached_encode(cache_dir, name: str, data: bytes, size: int, image_format: str) -> bytes:
+    """Кодирует миниатюру, если её ещё нет в кэше (имя уже содержит хеш исходника)"""
+    cache_file = Path(cache_dir) / name if cache_dir else None
+    if cache_file is not None and cache_file.exists():
+        return cache_file.read_bytes()
+    encoded = _encode(data, size, image_format)
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_bytes(encoded)
+    return encoded
+
+
+def _write_thumbnails(data: bytes, digest: str, stem: str, suffix: str, fallback_format: str,
+                      output_dir: Path, manifest, cache_dir, size: int) -> Thumbnail:
+    """Пишет миниатюры 1x/2x в WebP и запасном формате и возвращает их описание"""
+    encoded_files = []
+    srcset = []
+    webp_srcset = []
+    for scale in THUMBNAIL_SCALES:
+        pixels = size * scale
+        for image_format, ext, target in ((fallback_format, suffix, srcset), ("WEBP", ".webp", webp_srcset)):
+            name = f"{stem}-{digest}-{pixels}{ext}"
+            encoded_files.append((name, _cached_encode(cache_dir, name, data, pixels, image_format)))
+            target.append(f"img/{name} {scale}x")
+
+    # Пишем файлы только после успешного кодирования всех вариантов
+    for name, encoded in encoded_files:
+        manifest.write(output_dir / name, encoded, name)
+
+    return Thumbnail(
+        src=srcset[0].split(" ")[0],
+        srcset=", ".join(srcset),
+        webp_srcset=", ".join(webp_srcset),
+        width=size,
+        height=size,
+    )
+
+
+def build_thumbnails(icons, img_dir, output_dir, manifest, cache_dir=DEFAULT_THUMBNAIL_CACHE,
+                     size: int = THUMBNAIL_SIZE) -> dict[str, Thumbnail]:
+    """Готовит миниатюры только для используемых логотипов и возвращает {icon: Thumbnail}.
+
+    Имена файлов содержат хеш исходника, поэтому их можно кэшировать навсегда.
+    Без Pillow логотипы копируются как есть, но тоже под именами с хешем.
+    """
+    pillow = _load_pillow()
+    output_dir = Path(output_dir)
+    thumbnails = {}
+
+    for icon in sorted(set(filter(None, icons))):
+        source = Path(img_dir) / icon
+        if not source.is_file():
+            continue
+        data = source.read_bytes()
+        digest = source_hash(data)
+        stem, suffix = source.stem, source.suffix.lower()
+
+        fallback_format = FALLBACK_FORMATS.get(suffix)
+        thumbnail = None
+        if pillow is not None and fallback_format is not None:
+            try:
+                thumbnail = _write_thumbnails(data, digest, stem, suffix, fallback_format,
+                                              output_dir, manifest, cache_dir, size)
+            except OSError:
+                # Файл не удалось прочитать как изображение
+                thumbnail = None
+        if thumbnail is None:
+            # Pillow нет или формат не растровый: копируем оригинал под именем с хешем
+            name = f"{stem}-{digest}{suffix}"
+            manifest.write(output_dir / name, data, digest)
+            thumbnail = Thumbnail(src=f"img/{name}", srcset="", width=size, height=size)
+        thumbnails[icon] = thumbnail
+
+    return thumbnails
@@ -0,0 +1,123 @@
+# onevents/utils/loader.py
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import yaml
+
+from utils.manifest import write_atomic
+from utils.model import Event
+
+# Быстрый загрузчик на libyaml, если PyYAML собран с ним
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Снимок разобранных событий по умолчанию
+DEFAULT_SNAPSHOT_FILE = Path(".cache/events_snapshot.pickle")
+
+SNAPSHOT_VERSION = 3
+
+# Обязательные поля события
+REQUIRED_FIELDS = ("title", "date", "city")
+
+# С какого числа изменённых файлов разбирать их в пуле процессов
+PARALLEL_THRESHOLD = 64
+
+
+def parse_event_file(path) -> Event:
+    """Разбирает и проверяет YAML-файл события"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=SafeLoader)
+
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: описание события должно быть словарём")
+    missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+    if missing:
+        raise ValueError(f"{path}: не заполнены поля {', '.join(missing)}")
+    try:
+        datetime.strptime(str(data["date"]), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{path}: дата должна быть в формате YYYY-MM-DD") from None
+    try:
+        return Event.from_dict(data)
+    except (KeyError, TypeError, ValueError) as error:
+        if data.get("recurrence"):
+            section = "повторения"
+        elif data.get("sessions"):
+            section = "сессий"
+        else:
+            section = "события"
+        raise ValueError(f"{path}: некорректное описание {section}: {error}") from None
+
+
+def _file_key(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_snapshot(snapshot_file) -> dict:
+    if not snapshot_file or not Path(snapshot_file).exists():
+        return {}
+    try:
+        with open(snapshot_file, "rb") as f:
+            data = pickle.load(f)
+    except Exception:
+        # Повреждённый снимок просто пересобираем
+        return {}
+    if not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION:
+        return {}
+    return data.get("entries", {})
+
+
+def _write_snapshot(snapshot_file, entries: dict):
+    data = pickle.dumps({"version": SNAPSHOT_VERSION, "entries": entries}, protocol=pickle.HIGHEST_PROTOCOL)
+    write_atomic(snapshot_file, data)
+
+
+def load_event_files(events_dir, snapshot_file=None, workers: int | None = None,
+                     entries: dict | None = None) -> list[Event]:
+    """Загружает все события каталога в порядке имён файлов.
+
+    snapshot_file: снимок разобранных событий; заново разбираются только файлы,
+        у которых изменились mtime или размер
+    workers: число процессов для разбора (1 — без пула процессов)
+    entries: снимок в памяти {файл: ((mtime, размер), событие)}, который обновляется на месте;
+        так резидентный режим разбирает только изменившиеся файлы без чтения снимка с диска
+    """
+
+    files = sorted(Path(events_dir).glob("*.yml"))
+    if entries is None:
+        entries = _read_snapshot(snapshot_file)
+    elif not entries:
+        entries.update(_read_snapshot(snapshot_file))
+
+    keys = {}
+    stale = []
+    for file in files:
+        keys[file] = _file_key(file)
+        entry = entries.get(str(file))
+        if entry is None or entry[0] != keys[file]:
+            stale.append(file)
+
+    if len(stale) >= PARALLEL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(stale) // ((workers or os.cpu_count() or 1) * 4))
+            parsed = list(executor.map(parse_event_file, stale, chunksize=chunksize))
+    else:
+        parsed = [parse_event_file(file) for file in stale]
+
+    for file, data in zip(stale, parsed):
+        entries[str(file)] = (keys[file], data)
+
+    # Убираем из снимка удалённые файлы
+    actual = {str(file) for file in files}
+    removed = entries.keys() - actual
+    for name in removed:
+        del entries[name]
+
+    if snapshot_file and (stale or removed):
+        _write_snapshot(snapshot_file, entries)
+
+    return [entries[str(file)][1] for file in files]
@@ -0,0 +1,211 @@
+# onevents/utils/manifest.py
+
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+# Файл манифеста по умолчанию
+DEFAULT_MANIFEST_FILE = Path(".cache/build_manifest.json")
+
+MANIFEST_VERSION = 1
+
+# Размер буфера при потоковой записи файлов
+STREAM_BUFFER_SIZE = 1 << 16
+
+
+def hash_parts(*parts) -> str:
+    """Считает sha256 от набора строк/байтов"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def hash_files(paths) -> str:
+    """Считает общий хеш содержимого файлов (например, исходников генератора)"""
+    return hash_parts(*(Path(p).read_bytes() for p in sorted(paths)))
+
+
+def write_atomic(path, data):
+    """Атомарно записывает текст или байты: во временный файл рядом, затем os.replace.
+
+    Прерванная запись не оставляет обрезанный кэш или манифест.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    if isinstance(data, str):
+        tmp_path.write_text(data, encoding="utf-8")
+    else:
+        tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class BuildManifest:
+    """Манифест сборки: для каждого выходного файла хранит хеш входных данных.
+
+    Если хеш входов и сам файл на диске не изменились с прошлой сборки,
+    файл не генерируется и не перезаписывается (сохраняются байты и mtime).
+    """
+
+    def __init__(self, path=None, output_dir=None, stats=None):
+        self.path = Path(path) if path else None
+        self.stats = stats  # статистика сборки (BuildStats) для учёта записанных файлов
+        self.output_dir = Path(output_dir) if output_dir else None
+        self._previous: dict[str, dict] = {}
+        self._current: dict[str, dict] = {}
+        self.written = 0
+        self.skipped = 0
+        self.removed = 0
+
+    def _rel(self, output: Path) -> str:
+        output = Path(output)
+        if self.output_dir is not None:
+            try:
+                return output.relative_to(self.output_dir).as_posix()
+            except ValueError:
+                pass
+        return output.as_posix()
+
+    def load(self):
+        """Загружает манифест прошлой сборки того же каталога"""
+        if not self.path or not self.path.exists():
+            return self
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+        if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION:
+            return self
+        if data.get("output_dir") != str(self.output_dir):
+            return self
+        self._previous = data.get("outputs", {})
+        return self
+
+    def save(self):
+        """Сохраняет манифест текущей сборки"""
+        if not self.path:
+            return
+        data = {
+            "version": MANIFEST_VERSION,
+            "output_dir": str(self.output_dir),
+            "outputs": self._current,
+        }
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True))
+
+    def restart(self, stats=None):
+        """Начинает следующую сборку в том же процессе: выходы текущей становятся прошлыми"""
+        self._previous = self._current
+        self._current = {}
+        self.stats = stats
+        self.written = 0
+        self.skipped = 0
+        self.removed = 0
+        return self
+
+    def _record(self, output: Path, key: str, written: bool = False):
+        stat = Path(output).stat()
+        self._current[self._rel(output)] = {"key": key, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if written and self.stats is not None:
+            self.stats.add_output(self._rel(output), stat.st_size)
+
+    def unchanged(self, output: Path, key: str) -> bool:
+        """Проверяет, что файл собран из тех же входов и не менялся на диске.
+
+        Актуальный файл сразу учитывается в текущем манифесте.
+        """
+        entry = self._previous.get(self._rel(output))
+        if not entry or entry.get("key") != key:
+            return False
+        try:
+            stat = Path(output).stat()
+        except OSError:
+            return False
+        if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime"):
+            return False
+        self._current[self._rel(output)] = entry
+        self.skipped += 1
+        return True
+
+    def write(self, output: Path, content, key: str, mtime: float | None = None) -> bool:
+        """Записывает файл, только если его содержимое отличается от текущего.
+
+        mtime: время изменения файла (по нему веб-сервер формирует Last-Modified и ETag)
+        """
+        output = Path(output)
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        changed = True
+        try:
+            changed = output.read_bytes() != data
+        except OSError:
+            pass
+        if changed:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_bytes(data)
+            self.written += 1
+        else:
+            self.skipped += 1
+        if mtime is not None:
+            os.utime(output, (mtime, mtime))
+        self._record(output, key, changed)
+        return changed
+
+    def write_stream(self, output: Path, chunks, key: str, mtime: float | None = None) -> bool:
+        """Потоково пишет файл из фрагментов текста, не держа его целиком в памяти.
+
+        Файл собирается во временном файле рядом и заменяет старый, только если отличается.
+        mtime: время изменения файла, как в write
+        """
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output.with_name(output.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8", newline="", buffering=STREAM_BUFFER_SIZE) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        changed = not (output.exists() and filecmp.cmp(tmp_path, output, shallow=False))
+        if changed:
+            os.replace(tmp_path, output)
+            self.written += 1
+        else:
+            tmp_path.unlink()
+            self.skipped += 1
+        if mtime is not None:
+            os.utime(output, (mtime, mtime))
+        self._record(output, key, changed)
+        return changed
+
+    def outputs(self) -> list[Path]:
+        """Выходные файлы текущей сборки (записанные и оставленные без изменений)"""
+        return [self.output_dir / rel if self.output_dir is not None else Path(rel) for rel in sorted(self._current)]
+
+    def copy_tree(self, src: Path, dst: Path):
+        """Копирует каталог, пропуская файлы, которые не менялись"""
+        src = Path(src)
+        for file in sorted(src.rglob("*")):
+            if not file.is_file():
+                continue
+            target = Path(dst) / file.relative_to(src)
+            stat = file.stat()
+            key = hash_parts(file.relative_to(src).as_posix(), stat.st_size, stat.st_mtime_ns)
+            if self.unchanged(target, key):
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(file, target)
+            self.written += 1
+            self._record(target, key, True)
+
+    def remove_stale(self):
+        """Удаляет выходные файлы прошлой сборки, которые больше не создаются"""
+        for rel in self._previous.keys() - self._current.keys():
+            output = self.output_dir / rel if self.output_dir is not None else Path(rel)
+            try:
+                output.unlink()
+                self.removed += 1
+            except OSError:
+                pass
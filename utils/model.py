@@ -0,0 +1,209 @@
+# onevents/utils/model.py
+
+import hashlib
+import json
+import sys
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import date
+
+from utils.recurrence import Recurrence
+from utils.text import to_hhmmss
+
+# Названия «города» онлайн-событий
+ONLINE_CITIES = ("online", "онлайн")
+
+
+def parse_date(value) -> date:
+    """Дата события из YAML: строка YYYY-MM-DD или уже разобранная дата"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+@dataclass(frozen=True, slots=True)
+class Session:
+    """Сессия (день) многодневного события"""
+    date: date
+    start_time: str  # время как в описании события, например "9:00"
+    end_time: str
+    start: str = field(init=False, repr=False, compare=False)  # время начала в формате HHMMSS
+    end: str = field(init=False, repr=False, compare=False)    # время окончания в формате HHMMSS
+
+    def __post_init__(self):
+        object.__setattr__(self, "start", to_hhmmss(self.start_time))
+        object.__setattr__(self, "end", to_hhmmss(self.end_time))
+
+    def __reduce__(self):
+        return type(self), (self.date, self.start_time, self.end_time)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Session":
+        return cls(parse_date(data["date"]), str(data.get("start_time") or ""), str(data.get("end_time") or ""))
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    """Событие, разобранное один раз при загрузке. Не изменяется после создания."""
+    title: str
+    date: date
+    city: str
+    address: str = ""
+    description: str = ""
+    registration_url: str = ""
+    icon: str = ""
+    sessions: tuple[Session, ...] = ()  # отсортированы по дате и времени начала
+    recurrence: Recurrence | None = None  # правило повторения серии (вместо сессий)
+    digest: str = field(init=False, repr=False, compare=False)  # хеш содержимого события
+    recurrence_dates: tuple[date, ...] = field(init=False, repr=False, compare=False)  # даты повторений серии
+
+    def __post_init__(self):
+        # Названия городов повторяются у многих событий: храним одну копию строки
+        object.__setattr__(self, "city", sys.intern(self.city))
+        canonical = json.dumps(
+            [self.title, self.iso_date, self.city, self.address, self.description, self.registration_url,
+             self.icon, [[s.date.isoformat(), s.start_time, s.end_time] for s in self.sessions],
+             self.recurrence.canonical() if self.recurrence else None],
+            ensure_ascii=False,
+        )
+        object.__setattr__(self, "digest", hashlib.sha256(canonical.encode("utf-8")).hexdigest())
+        object.__setattr__(self, "recurrence_dates", self.recurrence.dates(self.date) if self.recurrence else ())
+
+    def __reduce__(self):
+        # При чтении снимка событие создаётся заново: город снова интернируется
+        return type(self), (self.title, self.date, self.city, self.address, self.description,
+                            self.registration_url, self.icon, self.sessions, self.recurrence)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Event":
+        """Создаёт событие из словаря YAML"""
+        sessions = sorted(
+            (Session.from_dict(s) for s in data.get("sessions") or ()),
+            key=lambda s: (s.date, s.start),
+        )
+        recurrence = Recurrence.from_dict(data["recurrence"]) if data.get("recurrence") else None
+        if recurrence and sessions:
+            raise ValueError("У события не может быть одновременно sessions и recurrence")
+        return cls(
+            title=str(data["title"]),
+            date=parse_date(data["date"]),
+            city=str(data["city"]).strip(),
+            address=str(data.get("address") or ""),
+            description=str(data.get("description") or ""),
+            registration_url=str(data.get("registration_url") or ""),
+            icon=str(data.get("icon") or ""),
+            sessions=tuple(sessions),
+            recurrence=recurrence,
+        )
+
+    @property
+    def iso_date(self) -> str:
+        """Дата начала в формате YYYY-MM-DD"""
+        return self.date.isoformat()
+
+    @property
+    def online(self) -> bool:
+        """Событие проходит онлайн"""
+        return self.city.casefold() in ONLINE_CITIES
+
+    @property
+    def month(self) -> str:
+        """Месяц начала в формате YYYY-MM"""
+        return self.iso_date[:7]
+
+    @property
+    def last_date(self) -> date:
+        """Последний день события с учётом его сессий и повторений"""
+        if self.recurrence_dates:
+            return self.recurrence_dates[-1]
+        return max(self.date, self.sessions[-1].date) if self.sessions else self.date
+
+    def next_date(self, today: date) -> date:
+        """Ближайшее к today повторение серии; для обычного события — дата начала"""
+        if not self.recurrence_dates:
+            return self.date
+        index = bisect_left(self.recurrence_dates, today)
+        return self.recurrence_dates[min(index, len(self.recurrence_dates) - 1)]
+
+    def sort_key(self) -> tuple[date, str, str]:
+        """Устойчивый порядок событий: дата, заголовок, город"""
+        return self.date, self.title, self.city
+
+
+class EventStore:
+    """События, отсортированные по дате, с индексом по городам.
+
+    Выборки по диапазону дат (в том числе внутри города) делаются бинарным
+    поиском: O(log n + k), где k — число найденных событий.
+    """
+
+    def __init__(self, events=()):
+        self.events: list[Event] = sorted(events, key=Event.sort_key)
+        self._dates = [event.date for event in self.events]
+        self._by_city: dict[str, list[Event]] = {}
+        for event in self.events:
+            if event.city:
+                self._by_city.setdefault(event.city, []).append(event)
+        self._city_dates = {city: [event.date for event in events] for city, events in self._by_city.items()}
+        # Серии обычно немногочисленны: их, в отличие от остальных событий, просматриваем целиком
+        self._recurring = [event for event in self.events if event.recurrence]
+        # Как и многодневные события (с сессиями на разные дни), которые идут и после дня начала
+        self._spanning = [event for event in self.events if event.last_date > event.date]
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    @staticmethod
+    def _slice(events, dates, start: date | None, end: date | None) -> list[Event]:
+        low = bisect_left(dates, start) if start is not None else 0
+        high = bisect_left(dates, end) if end is not None else len(events)
+        return events[low:high]
+
+    def between(self, start: date | None = None, end: date | None = None) -> list[Event]:
+        """События, которые начинаются в диапазоне [start, end)"""
+        return self._slice(self.events, self._dates, start, end)
+
+    def upcoming(self, today: date, city: str | None = None) -> list[Event]:
+        """События (города city, если он задан), которые начинаются сегодня или позже,
+        и начавшиеся раньше серии, у которых ещё остались повторения"""
+        events = self.between(today) if city is None else self.in_city(city, today)
+        ongoing = [
+            event for event in self._recurring
+            if event.date < today <= event.last_date and (city is None or event.city == city)
+        ]
+        return ongoing + events if ongoing else events
+
+    def overlapping(self, start: date | None = None, end: date | None = None, city: str | None = None) -> list[Event]:
+        """События (города city, если он задан), которые начинаются в диапазоне [start, end)
+        или начались раньше start и ещё идут в день start. Порядок — по дате начала."""
+        events = self.between(start, end) if city is None else self.in_city(city, start, end)
+        if start is None:
+            return events
+        ongoing = [
+            event for event in self._spanning
+            if event.date < start <= event.last_date and (city is None or event.city == city)
+        ]
+        return ongoing + events if ongoing else events
+
+    def cities(self) -> list[str]:
+        """Города событий по алфавиту"""
+        return sorted(self._by_city)
+
+    def in_city(self, city: str, start: date | None = None, end: date | None = None) -> list[Event]:
+        """События города, которые начинаются в диапазоне [start, end)"""
+        if city not in self._by_city:
+            return []
+        return self._slice(self._by_city[city], self._city_dates[city], start, end)
+
+    def by_city(self, events=None) -> dict[str, list[Event]]:
+        """События по городам в порядке дат; без events — все события хранилища"""
+        if events is None:
+            return {city: list(city_events) for city, city_events in self._by_city.items()}
+        result = {}
+        for event in events:
+            if event.city:
+                result.setdefault(event.city, []).append(event)
+        return result
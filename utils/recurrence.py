@@ -0,0 +1,282 @@
+# onevents/utils/recurrence.py
+
+import calendar
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from utils.text import to_hhmmss
+
+# Поддерживаемые частоты повторения RRULE
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY", "YEARLY")
+
+# Дни недели iCalendar в порядке date.weekday()
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+# Поддерживаемые части RRULE
+RULE_PARTS = ("FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "BYMONTHDAY")
+
+# Ограничение на число повторений одной серии
+MAX_OCCURRENCES = 1000
+
+# Сколько периодов подряд можно пройти, не найдя ни одного повторения
+MAX_EMPTY_PERIODS = 1000
+
+BYDAY_PATTERN = re.compile(r"([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)")
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    # UNTIL в RRULE пишется как 20301231 или 20301231T235959
+    if len(text) >= 8 and text[:8].isdigit():
+        return date(int(text[:4]), int(text[4:6]), int(text[6:8]))
+    return date.fromisoformat(text)
+
+
+def _parse_list(value) -> list[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value]
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+@dataclass(frozen=True, slots=True)
+class RecurrenceRule:
+    """Правило повторения (подмножество RRULE из RFC 5545).
+
+    Серия обязана быть конечной: нужен COUNT или UNTIL.
+    """
+    freq: str
+    interval: int = 1
+    count: int | None = None
+    until: date | None = None
+    byday: tuple[tuple[int, int], ...] = ()  # (номер дня недели в месяце или 0, день недели 0..6)
+    bymonthday: tuple[int, ...] = ()
+
+    def __post_init__(self):
+        if self.freq not in FREQUENCIES:
+            raise ValueError(f"Неподдерживаемая частота повторения: {self.freq}")
+        if self.interval < 1:
+            raise ValueError("INTERVAL должен быть положительным")
+        if (self.count is None) == (self.until is None):
+            raise ValueError("В правиле повторения нужен ровно один из COUNT и UNTIL")
+        if self.count is not None and not 1 <= self.count <= MAX_OCCURRENCES:
+            raise ValueError(f"COUNT должен быть от 1 до {MAX_OCCURRENCES}")
+        if self.freq in ("DAILY", "YEARLY") and (self.byday or self.bymonthday):
+            raise ValueError(f"BYDAY и BYMONTHDAY не поддерживаются для FREQ={self.freq}")
+        if self.freq == "WEEKLY" and (self.bymonthday or any(n for n, _ in self.byday)):
+            raise ValueError("Для FREQ=WEEKLY поддерживается только BYDAY без номера")
+
+    @classmethod
+    def parse(cls, value) -> "RecurrenceRule":
+        """Разбирает правило из строки «FREQ=WEEKLY;COUNT=10» или словаря YAML"""
+        if isinstance(value, dict):
+            parts = {str(name).strip().upper(): item for name, item in value.items()}
+        else:
+            text = str(value).strip()
+            if text.upper().startswith("RRULE:"):
+                text = text[len("RRULE:"):]
+            parts = {}
+            for item in text.split(";"):
+                if not item.strip():
+                    continue
+                name, sep, part = item.partition("=")
+                if not sep:
+                    raise ValueError(f"Некорректная часть правила повторения: {item}")
+                parts[name.strip().upper()] = part.strip()
+        unknown = set(parts) - set(RULE_PARTS)
+        if unknown:
+            raise ValueError(f"Неподдерживаемые части правила повторения: {', '.join(sorted(unknown))}")
+
+        byday = []
+        for item in _parse_list(parts.get("BYDAY") or ()):
+            match = BYDAY_PATTERN.fullmatch(item.upper())
+            if not match:
+                raise ValueError(f"Некорректный BYDAY: {item}")
+            ordinal = int(match.group(1) or 0)
+            if not -5 <= ordinal <= 5:
+                raise ValueError(f"Некорректный BYDAY: {item}")
+            byday.append((ordinal, WEEKDAYS.index(match.group(2))))
+        bymonthday = [int(item) for item in _parse_list(parts.get("BYMONTHDAY") or ())]
+        if any(not 1 <= abs(day) <= 31 for day in bymonthday):
+            raise ValueError("BYMONTHDAY должен быть от 1 до 31 (или от -31 до -1)")
+
+        return cls(
+            freq=str(parts.get("FREQ") or "").strip().upper(),
+            interval=int(parts.get("INTERVAL") or 1),
+            count=int(parts["COUNT"]) if parts.get("COUNT") else None,
+            until=_parse_date(parts["UNTIL"]) if parts.get("UNTIL") else None,
+            byday=tuple(sorted(set(byday))),
+            bymonthday=tuple(sorted(set(bymonthday))),
+        )
+
+    def to_ics(self) -> str:
+        """Значение RRULE для iCalendar.
+
+        UNTIL записывается плавающим временем конца дня: DTSTART серии тоже
+        без часового пояса, а RFC 5545 требует у них одинаковый тип значения.
+        """
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}T235959")
+        if self.byday:
+            parts.append("BYDAY=" + ",".join(
+                f"{ordinal or ''}{WEEKDAYS[weekday]}" for ordinal, weekday in self.byday
+            ))
+        if self.bymonthday:
+            parts.append("BYMONTHDAY=" + ",".join(str(day) for day in self.bymonthday))
+        return ";".join(parts)
+
+    def _month_dates(self, year: int, month: int, start: date) -> list[date]:
+        days_in_month = calendar.monthrange(year, month)[1]
+        monthdays = set()
+        for day in self.bymonthday:
+            day = day if day > 0 else days_in_month + day + 1
+            if 1 <= day <= days_in_month:
+                monthdays.add(day)
+        weekdays = set()
+        for ordinal, weekday in self.byday:
+            first = (weekday - date(year, month, 1).weekday()) % 7 + 1
+            matching = list(range(first, days_in_month + 1, 7))
+            if ordinal == 0:
+                weekdays.update(matching)
+            elif ordinal <= len(matching) and -ordinal <= len(matching):
+                weekdays.add(matching[ordinal - 1] if ordinal > 0 else matching[ordinal])
+        if self.byday and self.bymonthday:
+            # По RFC 5545 BYDAY вместе с BYMONTHDAY только ограничивает дни: FR и 13 — пятница, 13-е
+            days = monthdays & weekdays
+        elif self.byday or self.bymonthday:
+            days = monthdays | weekdays
+        elif start.day <= days_in_month:
+            # Без BYDAY и BYMONTHDAY повторяется число месяца из DTSTART; в коротких месяцах его нет
+            days = {start.day}
+        else:
+            days = set()
+        return [date(year, month, day) for day in sorted(days)]
+
+    def _period_dates(self, start: date, index: int) -> list[date]:
+        """Кандидаты в повторения для периода с номером index (дни, недели, месяцы или годы)"""
+        if self.freq == "DAILY":
+            return [start + timedelta(days=index * self.interval)]
+        if self.freq == "WEEKLY":
+            week_start = start - timedelta(days=start.weekday()) + timedelta(weeks=index * self.interval)
+            weekdays = sorted({weekday for _, weekday in self.byday}) or [start.weekday()]
+            return [week_start + timedelta(days=weekday) for weekday in weekdays]
+        if self.freq == "MONTHLY":
+            year, month = divmod(start.month - 1 + index * self.interval, 12)
+            return self._month_dates(start.year + year, month + 1, start)
+        year = start.year + index * self.interval
+        if start.month == 2 and start.day == 29 and not calendar.isleap(year):
+            return []
+        return [start.replace(year=year)]
+
+    def expand(self, start: date) -> list[date]:
+        """Даты повторений серии, которая начинается в start (DTSTART — первое повторение)"""
+        dates = []
+        empty_periods = 0
+        index = 0
+        while True:
+            candidates = [day for day in self._period_dates(start, index) if day >= start]
+            empty_periods = 0 if candidates else empty_periods + 1
+            if empty_periods > MAX_EMPTY_PERIODS:
+                break
+            for day in candidates:
+                if self.until is not None and day > self.until:
+                    return dates
+                dates.append(day)
+                if self.count is not None and len(dates) >= self.count:
+                    return dates
+                if len(dates) > MAX_OCCURRENCES:
+                    raise ValueError(f"В серии больше {MAX_OCCURRENCES} повторений")
+            index += 1
+        return dates
+
+
+@dataclass(frozen=True, slots=True)
+class Override:
+    """Изменённое повторение серии (VEVENT с RECURRENCE-ID). Пустые поля берутся из серии."""
+    date: date  # дата повторения по правилу, которое изменяется
+    start_time: str = ""
+    end_time: str = ""
+    description: str = ""
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Override":
+        return cls(
+            date=_parse_date(data["date"]),
+            start_time=str(data.get("start_time") or ""),
+            end_time=str(data.get("end_time") or ""),
+            description=str(data.get("description") or ""),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Recurrence:
+    """Повторение события: правило, дополнительные (RDATE) и исключённые (EXDATE) даты,
+    изменённые повторения. Время начала и окончания общее для всех повторений."""
+    rule: RecurrenceRule
+    start_time: str  # время как в описании события, например "9:00"
+    end_time: str
+    rdates: tuple[date, ...] = ()
+    exdates: tuple[date, ...] = ()
+    overrides: tuple[Override, ...] = ()  # отсортированы по дате
+    start: str = field(init=False, repr=False, compare=False)  # время начала в формате HHMMSS
+    end: str = field(init=False, repr=False, compare=False)    # время окончания в формате HHMMSS
+
+    def __post_init__(self):
+        object.__setattr__(self, "start", to_hhmmss(self.start_time))
+        object.__setattr__(self, "end", to_hhmmss(self.end_time))
+
+    def __reduce__(self):
+        return type(self), (self.rule, self.start_time, self.end_time, self.rdates, self.exdates, self.overrides)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Recurrence":
+        """Создаёт повторение из секции recurrence YAML"""
+        if not data.get("rrule"):
+            raise ValueError("В секции recurrence нет правила rrule")
+        if not data.get("start_time") or not data.get("end_time"):
+            raise ValueError("В секции recurrence нужны start_time и end_time")
+        return cls(
+            rule=RecurrenceRule.parse(data["rrule"]),
+            start_time=str(data["start_time"]),
+            end_time=str(data["end_time"]),
+            rdates=tuple(sorted({_parse_date(d) for d in _parse_list(data.get("rdate") or ())})),
+            exdates=tuple(sorted({_parse_date(d) for d in _parse_list(data.get("exdate") or ())})),
+            overrides=tuple(sorted(
+                (Override.from_dict(o) for o in data.get("overrides") or ()),
+                key=lambda o: o.date,
+            )),
+        )
+
+    def canonical(self) -> list:
+        """Содержимое повторения для хеша события"""
+        return [
+            self.rule.to_ics(), self.start_time, self.end_time,
+            [d.isoformat() for d in self.rdates], [d.isoformat() for d in self.exdates],
+            [[o.date.isoformat(), o.start_time, o.end_time, o.description] for o in self.overrides],
+        ]
+
+    def dates(self, start: date) -> tuple[date, ...]:
+        """Даты всех повторений серии: по правилу и RDATE, без EXDATE.
+
+        Проверяет, что серия начинается в start и что изменённые повторения
+        относятся к существующим датам.
+        """
+        rule_dates = self.rule.expand(start)
+        if not rule_dates or rule_dates[0] != start:
+            raise ValueError(f"Дата события {start.isoformat()} не совпадает с первым повторением по правилу")
+        exdates = set(self.exdates)
+        dates = tuple(sorted(set(rule_dates).union(self.rdates) - exdates))
+        if not dates:
+            raise ValueError("Все повторения серии исключены")
+        known = set(dates)
+        for override in self.overrides:
+            if override.date not in known:
+                raise ValueError(f"Изменённое повторение {override.date.isoformat()} не входит в серию")
+        return dates
@@ -0,0 +1,115 @@
+# onevents/utils/revisions.py
+
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from utils.manifest import write_atomic
+
+# Файл ревизий по умолчанию
+DEFAULT_REVISIONS_FILE = Path(".cache/event_revisions.json")
+
+REVISIONS_VERSION = 2
+
+# Формат даты-времени в UTC для iCalendar
+ICS_UTC_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+def format_ics_utc(timestamp: float) -> str:
+    """Время как дата-время iCalendar в UTC (20300115T090000Z)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(ICS_UTC_FORMAT)
+
+
+class EventRevisions:
+    """Ревизии VEVENT: для каждого UID хеш содержимого, время его изменения, номер SEQUENCE
+    и хеш события, которому VEVENT принадлежит. Отдельно — ревизии календарей.
+
+    Пока содержимое VEVENT не меняется, его DTSTAMP, LAST-MODIFIED и SEQUENCE
+    остаются прежними, поэтому календари между сборками совпадают байт в байт.
+    Новое содержимое получает время сборки, в которой оно появилось.
+    """
+
+    def __init__(self, path=None, now: float | None = None):
+        self.path = Path(path) if path else None
+        self.now = int(now if now is not None else time.time())
+        self._entries: dict[str, list] = {}
+        self._feeds: dict[str, list] = {}
+        self._feeds_seen: set[str] = set()
+        self._dirty = False
+
+    def load(self):
+        """Загружает ревизии прошлых сборок. Повреждённый или чужой файл игнорируется."""
+        if not self.path or not self.path.exists():
+            return self
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+        if not isinstance(data, dict) or data.get("version") != REVISIONS_VERSION:
+            return self
+        events, feeds = data.get("events"), data.get("feeds")
+        if not isinstance(events, dict) or not isinstance(feeds, dict):
+            return self
+        # Повреждённые записи пропускаем: такой VEVENT получит новую ревизию
+        self._entries = {uid: entry for uid, entry in events.items() if isinstance(entry, list) and len(entry) == 4}
+        self._feeds = {name: entry for name, entry in feeds.items() if isinstance(entry, list) and len(entry) == 2}
+        return self
+
+    def save(self):
+        """Сохраняет ревизии, если они менялись. Запись атомарная."""
+        if not self.path or not self._dirty:
+            return
+        data = {"version": REVISIONS_VERSION, "events": self._entries, "feeds": self._feeds}
+        write_atomic(self.path, json.dumps(data, separators=(",", ":"), sort_keys=True))
+        self._dirty = False
+
+    def stamp(self, uid: str, digest: str, owner: str) -> tuple[int, int]:
+        """Возвращает (время изменения, SEQUENCE) для VEVENT с данным UID и хешем содержимого
+
+        owner: хеш события, которому принадлежит VEVENT (по нему prune() находит устаревшие ревизии)
+        """
+        entry = self._entries.get(uid)
+        if entry is not None and entry[0] == digest:
+            if entry[3] != owner:
+                # Событие сменило хеш, не изменив этот VEVENT (например, добавилась сессия)
+                entry[3] = owner
+                self._dirty = True
+            return entry[1], entry[2]
+        sequence = entry[2] + 1 if entry is not None else 0
+        self._entries[uid] = [digest, self.now, sequence, owner]
+        self._dirty = True
+        return self.now, sequence
+
+    def feed_stamp(self, name: str, key: str) -> int:
+        """Время изменения календаря name: меняется на время сборки, когда меняется ключ его содержимого.
+
+        В отличие от максимума по событиям, время растёт и тогда, когда событие
+        уходит из календаря, поэтому If-Modified-Since по нему надёжен.
+        """
+        self._feeds_seen.add(name)
+        entry = self._feeds.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        self._feeds[name] = [key, self.now]
+        self._dirty = True
+        return self.now
+
+    def keep_feed(self, name: str):
+        """Отмечает календарь, который не пересобирался: его время изменения не меняется"""
+        self._feeds_seen.add(name)
+
+    def prune(self, owners):
+        """Удаляет ревизии событий, которых больше нет (хеш владельца не в owners),
+        и календарей, которые не отмечались с прошлой очистки.
+        """
+        owners = set(owners)
+        stale = [uid for uid, entry in self._entries.items() if entry[3] not in owners]
+        stale_feeds = [name for name in self._feeds if name not in self._feeds_seen]
+        for uid in stale:
+            del self._entries[uid]
+        for name in stale_feeds:
+            del self._feeds[name]
+        self._feeds_seen = set()
+        if stale or stale_feeds:
+            self._dirty = True
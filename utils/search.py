@@ -0,0 +1,84 @@
+# onevents/utils/search.py
+
+import re
+from datetime import date
+
+from utils.text import HTML_TAG_PATTERN
+
+# Версия формата events.json
+INDEX_VERSION = 2
+
+# Начало отсчёта дней в индексе
+EPOCH = date(1970, 1, 1)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Короткие служебные слова, которые не индексируем
+STOP_WORDS = frozenset({
+    "и", "в", "во", "на", "по", "с", "со", "к", "ко", "о", "об", "от", "до", "для", "из", "за",
+    "не", "а", "но", "или", "что", "как", "это", "the", "and", "of", "for", "in", "on",
+})
+
+
+def normalize_word(word: str) -> str:
+    """Приводит слово к нормальной форме для поиска: регистр и «ё» → «е»"""
+    return word.casefold().replace("ё", "е")
+
+
+def tokenize(text) -> list[str]:
+    """Разбивает текст на нормализованные токены без HTML и служебных слов"""
+    text = HTML_TAG_PATTERN.sub(" ", str(text or ""))
+    tokens = []
+    for word in WORD_PATTERN.findall(text):
+        token = normalize_word(word)
+        if len(token) > 1 and token not in STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+
+def day_ordinal(value: date) -> int:
+    """Дата как число дней от 1970-01-01"""
+    return (value - EPOCH).days
+
+
+def build_event_index(events, link=None, today: date | None = None) -> dict:
+    """Строит компактный индекс событий (utils.model.Event) для поиска на странице.
+
+    События хранятся столбцами, города и логотипы — в таблицах (строки не повторяются),
+    для города, месяца и слов заголовка/описания заранее посчитаны списки номеров событий.
+    Служебные слова передаются вместе с индексом, чтобы страница убирала их из запроса так же.
+
+    link: функция, возвращающая ссылку для события (по умолчанию registration_url)
+    today: начавшаяся серия попадает в индекс датой и месяцем ближайшего повторения, как на страницах
+    """
+    cities: dict[str, int] = {}
+    icons: dict[str, int] = {}
+    columns = {"title": [], "day": [], "city": [], "icon": [], "url": []}
+    postings = {"city": {}, "month": {}, "token": {}}
+
+    for number, event in enumerate(events):
+        city_id = cities.setdefault(event.city, len(cities))
+        icon_id = icons.setdefault(event.icon, len(icons))
+
+        columns["title"].append(event.title)
+        start = event.next_date(today) if today else event.date
+        columns["day"].append(day_ordinal(start))
+        columns["city"].append(city_id)
+        columns["icon"].append(icon_id)
+        columns["url"].append(link(event) if link else event.registration_url)
+
+        postings["city"].setdefault(str(city_id), []).append(number)
+        postings["month"].setdefault(start.isoformat()[:7], []).append(number)
+        for token in dict.fromkeys(tokenize(event.title) + tokenize(event.description)):
+            postings["token"].setdefault(token, []).append(number)
+
+    return {
+        "version": INDEX_VERSION,
+        "epoch": EPOCH.isoformat(),
+        "count": len(columns["title"]),
+        "cities": list(cities),
+        "icons": list(icons),
+        "events": columns,
+        "postings": {name: dict(sorted(values.items())) for name, values in postings.items()},
+        "stop_words": sorted(STOP_WORDS),
+    }
@@ -0,0 +1,234 @@
+# onevents/utils/shortener.py
+
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from utils.manifest import write_atomic
+
+# Сервис сокращения ссылок
+SHORTENER_URL = 'https://clck.ru/--'
+SHORTENER_TIMEOUT = 5
+
+# Параметры пакетного сокращения
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DEADLINE = 30  # общий лимит времени на все запросы, секунд
+
+# Параметры кэша по умолчанию
+DEFAULT_CACHE_FILE = Path(".cache/short_urls.json")
+DEFAULT_CACHE_TTL = 90 * 24 * 60 * 60  # 90 дней в секундах
+DEFAULT_CACHE_SIZE = 5000
+
+CACHE_VERSION = 1
+
+
+class UrlCache:
+    """Постоянный кэш коротких ссылок с TTL и вытеснением по LRU.
+
+    Хранится в компактном JSON-файле в виде списка записей [url, short, ts]
+    в порядке от давно использованных к недавно использованным.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl: float = DEFAULT_CACHE_TTL,
+                 max_entries: int = DEFAULT_CACHE_SIZE):
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._dirty = False
+        self._saved_order: list[str] = []  # порядок записей в файле, чтобы не переписывать его без изменений
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        """Загружает кэш с диска. Повреждённый или чужой файл игнорируется, повреждённые записи пропускаются."""
+        if not self.path or not self.path.exists():
+            return self
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return self
+        entries = data.get("entries")
+        if not isinstance(entries, list):
+            return self
+        for entry in entries:
+            try:
+                url, short, ts = entry
+                if not isinstance(url, str) or not isinstance(short, str):
+                    raise TypeError(url)
+                self._entries[url] = (short, float(ts))
+            except (TypeError, ValueError):
+                self._dirty = True
+        self._saved_order = list(self._entries)
+        self._evict()
+        return self
+
+    def save(self):
+        """Сохраняет кэш на диск, если он менялся (в том числе порядок LRU). Запись атомарная."""
+        if not self.path:
+            return
+        if not self._dirty and list(self._entries) == self._saved_order:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "entries": [[url, short, ts] for url, (short, ts) in self._entries.items()],
+        }
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+        self._dirty = False
+        self._saved_order = list(self._entries)
+
+    def get(self, url: str, allow_stale: bool = False):
+        """Возвращает короткую ссылку из кэша или None.
+
+        allow_stale: вернуть значение, даже если истёк TTL (для режима offline)
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            self.misses += 1
+            return None
+        short, ts = entry
+        if not allow_stale and self.ttl is not None and time.time() - ts > self.ttl:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(url)
+        self.hits += 1
+        return short
+
+    def peek(self, url: str):
+        """Возвращает короткую ссылку даже с истёкшим TTL, не влияя на LRU и счётчики"""
+        entry = self._entries.get(url)
+        return entry[0] if entry is not None else None
+
+    def set(self, url: str, short: str):
+        """Запоминает короткую ссылку для URL"""
+        self._entries[url] = (short, time.time())
+        self._entries.move_to_end(url)
+        self._dirty = True
+        self._evict()
+
+    def _evict(self):
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._dirty = True
+
+
+def _request_short_url(url: str, session=None, endpoint: str = SHORTENER_URL,
+                       timeout: float = SHORTENER_TIMEOUT, stats=None) -> str | None:
+    """Запрашивает короткую ссылку у сервиса. При ошибке возвращает None.
+
+    stats: статистика сборки (BuildStats) для учёта числа и длительности запросов
+    """
+    import requests
+
+    started = time.perf_counter()
+    try:
+        getter = session.get if session is not None else requests.get
+        response = getter(endpoint, params={'url': url}, timeout=timeout)
+        if response.status_code == 200:
+            return response.text.strip() or None
+        # Сервис недоступен
+        return None
+    except Exception:
+        # Любая сетевая ошибка
+        return None
+    finally:
+        if stats is not None:
+            stats.count_call("shorten_url", time.perf_counter() - started)
+
+
+def shorten_url(url: str, cache: UrlCache | None = None, offline: bool = False,
+                endpoint: str = SHORTENER_URL, stats=None) -> str:
+    """Сокращает URL через сервис clck.ru.
+
+    cache: кэш коротких ссылок; при попадании сеть не используется
+    offline: не обращаться к сети, брать значение только из кэша (или исходный URL)
+    endpoint: адрес сервиса сокращения
+    stats: статистика сборки для учёта запросов к сервису
+    """
+
+    if not url:
+        return url
+
+    if cache is not None:
+        cached = cache.get(url, allow_stale=offline)
+        if cached:
+            return cached
+
+    if offline:
+        return url
+
+    short = _request_short_url(url, endpoint=endpoint, stats=stats)
+    if short is None:
+        # Если сервис недоступен, оставляем прежнюю короткую ссылку (ссылки не «прыгают»
+        # между сборками), а если её нет — возвращаем оригинальную
+        return (cache.peek(url) if cache is not None else None) or url
+    if cache is not None:
+        cache.set(url, short)
+    return short
+
+
+def shorten_urls(urls, cache: UrlCache | None = None, offline: bool = False,
+                 endpoint: str = SHORTENER_URL, concurrency: int = DEFAULT_CONCURRENCY,
+                 deadline: float = DEFAULT_DEADLINE, stats=None) -> dict[str, str]:
+    """Сокращает набор URL параллельно и возвращает словарь {исходный URL: короткий}.
+
+    Повторяющиеся URL запрашиваются один раз, запросы идут через общий
+    пул соединений requests.Session не более чем в concurrency потоков.
+    Всё, что не успело завершиться за deadline секунд, получает прежнюю короткую ссылку
+    из кэша (даже устаревшую) или остаётся исходной ссылкой.
+    """
+
+    result = {}
+    pending = []
+    for url in dict.fromkeys(u for u in urls if u):
+        cached = cache.get(url, allow_stale=offline) if cache is not None else None
+        if cached:
+            result[url] = cached
+        elif offline:
+            result[url] = url
+        else:
+            pending.append(url)
+
+    if not pending:
+        return result
+
+    import requests
+
+    started = time.monotonic()
+    workers = max(1, min(concurrency, len(pending)))
+
+    def fetch(url):
+        remaining = deadline - (time.monotonic() - started)
+        if remaining <= 0:
+            return None
+        return _request_short_url(url, session=session, endpoint=endpoint,
+                                  timeout=min(SHORTENER_TIMEOUT, remaining), stats=stats)
+
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        executor = ThreadPoolExecutor(max_workers=workers)
+        futures = {executor.submit(fetch, url): url for url in pending}
+        done, _ = wait(futures, timeout=deadline)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+        for future, url in futures.items():
+            short = future.result() if future in done else None
+            if short is None:
+                # Не дождались ответа: прежняя короткая ссылка лучше, чем исходная
+                result[url] = (cache.peek(url) if cache is not None else None) or url
+                continue
+            result[url] = short
+            if cache is not None:
+                cache.set(url, short)
+
+    return result
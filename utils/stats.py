@@ -0,0 +1,102 @@
+# onevents/utils/stats.py
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def output_category(rel_path: str) -> str:
+    """Определяет категорию выходного файла по его пути внутри site/"""
+    name = rel_path.rsplit("/", 1)[-1]
+    if name.endswith((".gz", ".br")):
+        return "compressed"
+    if rel_path.startswith("calendar/"):
+        if name.startswith("onevents-archive"):
+            return "archive_ics"
+        return "public_ics" if name.startswith("onevents-public") else "event_ics"
+    if rel_path.startswith("img/"):
+        return "images"
+    if rel_path.startswith("icons/"):
+        return "icons"
+    if name.endswith(".html"):
+        return "html"
+    if name.endswith(".json"):
+        return "index"
+    return "other"
+
+
+class BuildStats:
+    """Статистика сборки: время стадий, сетевые вызовы и записанные файлы"""
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+        self.calls: dict[str, dict] = {}
+        self.outputs: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замеряет настенное и процессорное время стадии"""
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            entry["wall"] += time.perf_counter() - wall
+            entry["cpu"] += time.process_time() - cpu
+
+    def count_call(self, name: str, seconds: float):
+        """Учитывает вызов (например, запрос к clck.ru) и его длительность"""
+        with self._lock:
+            entry = self.calls.setdefault(name, {"calls": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+
+    def add_output(self, rel_path: str, size: int):
+        """Учитывает записанный выходной файл"""
+        with self._lock:
+            entry = self.outputs.setdefault(output_category(rel_path), {"files": 0, "bytes": 0})
+            entry["files"] += 1
+            entry["bytes"] += size
+
+    def to_dict(self) -> dict:
+        return {
+            "wall": round(time.perf_counter() - self._started, 6),
+            "cpu": round(time.process_time() - self._started_cpu, 6),
+            "stages": {
+                name: {"wall": round(v["wall"], 6), "cpu": round(v["cpu"], 6)}
+                for name, v in self.stages.items()
+            },
+            "calls": {
+                name: {"calls": v["calls"], "seconds": round(v["seconds"], 6)}
+                for name, v in self.calls.items()
+            },
+            "outputs": self.outputs,
+        }
+
+    def write_json(self, path):
+        """Сохраняет статистику в JSON для архивирования в CI"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def format(self) -> str:
+        """Форматирует статистику в виде текстовой таблицы"""
+        data = self.to_dict()
+        lines = [f"Сборка: {data['wall']:.3f} с (CPU {data['cpu']:.3f} с)", "Стадии:"]
+        for name, v in data["stages"].items():
+            lines.append(f"  {name:<20} {v['wall']:8.3f} с  CPU {v['cpu']:8.3f} с")
+        if data["calls"]:
+            lines.append("Вызовы:")
+            for name, v in data["calls"].items():
+                lines.append(f"  {name:<20} {v['calls']:8} шт.  {v['seconds']:8.3f} с")
+        if data["outputs"]:
+            lines.append("Записано файлов:")
+            for name, v in sorted(data["outputs"].items()):
+                lines.append(f"  {name:<20} {v['files']:8} шт.  {v['bytes']:10} байт")
+        return "\n".join(lines)
@@ -2,20 +2,19 @@
 
 import re
 
+from utils.ics import escape_text
+
 # Общие регулярные выражения
 SAFE_CHARS_PATTERN = re.compile(r'[^\w\s-]')
 DASHES_SPACES_PATTERN = re.compile(r'[-\s]+')
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
 
 def clean_text(text):
     """Очищает текст от HTML и экранирует специальные символы для ICS"""
     # Убираем HTML теги
-    text = re.sub(r'<[^>]+>', '', text)
+    text = HTML_TAG_PATTERN.sub('', text)
     # Экранируем специальные символы для ICS
-    text = text.replace('\\', '\\\\')
-    text = text.replace(',', '\\,')
-    text = text.replace(';', '\\;')
-    text = text.replace('\n', '\\n')
-    return text
+    return escape_text(text)
 
 
 def make_slug(text: str) -> str:
@@ -0,0 +1,54 @@
+# onevents/utils/watch.py
+
+import time
+from pathlib import Path
+
+# Интервал опроса файлов по умолчанию, секунд
+DEFAULT_INTERVAL = 0.2
+
+
+class PollingWatcher:
+    """Следит за файлами и каталогами опросом mtime и размера.
+
+    Работает без внешних зависимостей на любой ОС; для каталогов с сотнями
+    и тысячами файлов один проход занимает миллисекунды.
+    """
+
+    def __init__(self, paths, interval: float = DEFAULT_INTERVAL):
+        self.paths = [Path(p) for p in paths]
+        self.interval = interval
+        self._files = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        files = {}
+        for path in self.paths:
+            candidates = path.rglob("*") if path.is_dir() else [path]
+            for file in candidates:
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                if not file.is_dir():
+                    files[file] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self) -> set[Path]:
+        """Возвращает файлы, которые появились, изменились или исчезли с прошлого опроса"""
+        files = self._scan()
+        changed = {
+            file for file in files.keys() | self._files.keys()
+            if files.get(file) != self._files.get(file)
+        }
+        self._files = files
+        return changed
+
+    def wait(self, timeout: float | None = None) -> set[Path]:
+        """Ждёт изменений и возвращает изменённые файлы (пустое множество по таймауту)"""
+        started = time.monotonic()
+        while True:
+            changed = self.poll()
+            if changed:
+                return changed
+            if timeout is not None and time.monotonic() - started >= timeout:
+                return set()
+            time.sleep(self.interval)